@@ -1,4 +1,33 @@
+import multiprocessing
+import os
 import random
+import threading
+import time
+
+import ChessEngine
+import ChessEval
+import ChessOrdering
+import ChessTransposition
+
+CHECKMATE = 100000  # score for delivering mate, mates found sooner score a little higher (CHECKMATE - ply)
+MATE_BOUND = CHECKMATE - 1000  # anything above this is a mate score rather than material
+MAX_DEPTH = 4
+DELTA_MARGIN = 200  # quiescence skips a capture that couldn't lift the score to alpha even with this much to spare
+NULL_MOVE_PRUNING = True  # defaults for negamax_search, switch off to compare with self-play (ChessTournament.py)
+LATE_MOVE_REDUCTIONS = True
+NULL_MOVE_MIN_DEPTH = 3  # null-move pruning is tried this many plies or more from the leaves
+NULL_MOVE_REDUCTION = 2  # how much shallower the null-move search is, one more from depth 7 on
+LATE_MOVE_MIN_DEPTH = 3
+LATE_MOVE_INDEX = 3  # moves after this many in the ordered list are searched a ply shallower if they are quiet
+TIME_LIMIT = None  # seconds, None means always search to MAX_DEPTH
+BATCH_THRESHOLD = 8  # min_max scores replies in a NumPy batch when there are at least this many (python ChessEval.py times it)
+transposition_table = ChessTransposition.transposition_table()  # shared between moves so later searches reuse earlier work
+# min_max's own table: its entries are exact depth-1 scores without quiescence, which negamax mustn't take for its own
+min_max_table = ChessTransposition.transposition_table(16)
+move_ordering = ChessOrdering.move_orderer()  # history carries over between moves too
+opening_book = None  # a ChessBook.opening_book to play from before searching, None plays without one
+endgame_tables = None  # a ChessTablebase.tablebase for perfect play with three pieces or fewer, None searches them
+search_stats = None  # a ChessStats.search_stats every search fills in, None leaves the counters off
 
 def random_ai(valid_moves):
     return valid_moves[random.randint(0, len(valid_moves)-1)]
@@ -14,15 +43,15 @@ def greedy_algorithm(game_state, valid_moves):
         whiteorblack = -1
 
     best_move = None
-    score_maximum = -1000  # most minimum value possible which is getting checkmated
+    score_maximum = -CHECKMATE  # most minimum value possible which is getting checkmated
     for player_move in valid_moves:  # runs through each possible move
         game_state.make_move(player_move)  # makes the move and sees the board score
         if game_state.check_mate:
-            score = 1000
+            score = CHECKMATE
         elif game_state.stale_mate:
             score = 0
         else:
-            score = whiteorblack * board_score(game_state.board)  # makes it so from either black or white perspective it is trying to get a maximum score
+            score = whiteorblack * white_score(game_state)  # makes it so from either black or white perspective it is trying to get a maximum score
         if score > score_maximum:  # black is trying to get the lowest value of max score as it is zero-sum game
             score_maximum = score
             best_move = player_move
@@ -30,59 +59,769 @@ def greedy_algorithm(game_state, valid_moves):
     return best_move
 
 
+"""
+Node count of a min_max call, read the same way as a negamax_search's so the two can be compared. min_max has no
+quiescence search
+"""
+
+
+class min_max_counts():
+    def __init__(self, nodes=0):
+        self.nodes = nodes
+        self.quiescence_nodes = 0
 
-def min_max(game_state, valid_moves):
+
+last_min_max = min_max_counts()  # counts from the last min_max call
+
+
+def min_max(game_state, valid_moves, table=None):
+    global last_min_max
+    if table is None:
+        table = min_max_table
+    table.new_search()
+    stats = search_stats
+    nodes = 0
+    if stats is not None:
+        stats.begin(game_state, table)
     if game_state.white_turn:  # because it's a zero-sum game black's side is negative
         whiteorblack = 1
     else:
         whiteorblack = -1
     random.shuffle(valid_moves)
     player_best_move = None
-    enemy_min_max_score = 1000
+    enemy_min_max_score = CHECKMATE
     for player_move in valid_moves:  # looks at possible moves from players perspective
         game_state.make_move(player_move)
-        enemy_moves = game_state.get_valid_moves()# 1000 represents checkmate
-        enemy_max_score = -1000
-        for enemy_move in enemy_moves:  # looks at each possible enemy move from every player's move
-            game_state.make_move(enemy_move)
-            if game_state.check_mate:
-                score = -1 * whiteorblack * 1000  # double negative = positive as it flips after looking at opponents next move
-            elif game_state.stale_mate:  # 0 represents stalemate
-                score = 0
-            else:
-                score = -1 * whiteorblack * board_score(game_state.board) # makes it so from either black or white perspective it is trying to get a maximum score
-            if score > enemy_max_score:  # black is trying to get the lowest value of max score as it is zero-sum game
-                enemy_max_score = score
-            game_state.undo_move()
+        nodes += 1
+        entry = table.probe(game_state.zobrist_key)
+        # enemy's replies already searched from this position, only an exact score is the best reply's
+        if entry is not None and entry[0] >= 1 and entry[1] == ChessTransposition.EXACT:
+            enemy_max_score = entry[2]
+        else:
+            enemy_moves = game_state.get_valid_moves()# CHECKMATE represents checkmate
+            enemy_max_score = -CHECKMATE
+            enemy_best_move = None
+            if ChessEval.numpy is not None and len(enemy_moves) >= BATCH_THRESHOLD and not ChessEval.DEBUG:
+                # every reply scored in one NumPy batch; check_mate and stale_mate can't be set after a reply as
+                # nothing recomputes them, so the board score is all the loop below would use
+                scores = ChessEval.evaluate_batch(game_state, [enemy_move.packed for enemy_move in enemy_moves])
+                nodes += len(enemy_moves)
+                if stats is not None:
+                    stats.evaluations += len(enemy_moves)
+                best = int((-whiteorblack * scores).argmax())
+                enemy_max_score = -whiteorblack * int(scores[best])
+                enemy_best_move = enemy_moves[best]
+                enemy_moves = []
+            for enemy_move in enemy_moves:  # looks at each possible enemy move from every player's move
+                game_state.make_move(enemy_move)
+                nodes += 1
+                if game_state.check_mate:
+                    score = -1 * whiteorblack * CHECKMATE  # double negative = positive as it flips after looking at opponents next move
+                elif game_state.stale_mate:  # 0 represents stalemate
+                    score = 0
+                else:
+                    score = -1 * whiteorblack * white_score(game_state) # makes it so from either black or white perspective it is trying to get a maximum score
+                if score > enemy_max_score:  # black is trying to get the lowest value of max score as it is zero-sum game
+                    enemy_max_score = score
+                    enemy_best_move = enemy_move
+                game_state.undo_move()
+            # every reply was looked at so the score is exact, stored from the enemy's (side to move's) point of view
+            table.store(game_state.zobrist_key, 1, ChessTransposition.EXACT, enemy_max_score,
+                        enemy_best_move.packed if enemy_best_move is not None else None)
         if enemy_min_max_score > enemy_max_score:  # opponents max score is lower then opponents previous score then that is preferable
             enemy_min_max_score = enemy_max_score
             player_best_move = player_move
         game_state.undo_move()
+    if stats is not None:
+        stats.finish(game_state, nodes=nodes)
+    last_min_max = min_max_counts(nodes)
     return player_best_move
 
 """
-Sum of material strength on board
-"""
-
-def board_score(board):
-    score = 0
-    for r in board:  # for each row
-        for s in r:  # for each square to get material
-            if s[0] == 'w':  # + and - because of zero-sum game
-                multiplier = 1
-            elif s[0] == 'b':
-                multiplier = -1
-            else:  # if empty square then next if
-                continue
-            if s[1] == 'p':
-                score += multiplier*1
-            elif s[1] == 'N' or s[1] == 'B':
-                score += multiplier*3
-            elif s[1] == 'r':
-                score += multiplier*5
-            elif s[1] == 'Q':
-                score += multiplier*10
-            elif s[1] == 'K':
-                score += 0
-
-    return score
\ No newline at end of file
+Raised inside the search when the time budget runs out, unwinding straight back to the root
+"""
+
+
+class search_timeout(Exception):
+    pass
+
+
+"""
+Negamax alpha-beta search with iterative deepening. Searches depth 1, 2, 3... up to max_depth, stopping early if
+time_limit seconds pass, and plays the best move of the last depth that finished. Every score is from the point of view
+of the player to move, so one function handles both sides by negating the child's score. Inside the search moves are
+packed ints (see ChessEngine), only the move returned is a move object
+"""
+
+
+class negamax_search():
+    def __init__(self, max_depth=MAX_DEPTH, time_limit=TIME_LIMIT, table=None, ordering=None, stats=None,
+                 null_move=None, late_move_reductions=None):
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.table = table if table is not None else transposition_table
+        self.ordering = ordering if ordering is not None else move_ordering
+        self.stats = stats if stats is not None else search_stats  # a ChessStats.search_stats to fill in, or None
+        self.nodes = 0
+        self.quiescence_nodes = 0  # counted apart from nodes, which are the full-width part of the tree
+        self.nodes_before = 0  # the counts when the current search started, nodes carry on across searches
+        self.quiescence_before = 0
+        self.delta_pruned = 0  # captures quiescence skipped because even winning the piece couldn't reach alpha
+        self.exchange_pruned = 0  # captures quiescence skipped because they lose material (static exchange below 0)
+        self.draw_cutoffs = 0  # positions scored as draws straight away, repeated or past the fifty-move rule
+        self.null_move = NULL_MOVE_PRUNING if null_move is None else null_move
+        self.late_move_reductions = LATE_MOVE_REDUCTIONS if late_move_reductions is None else late_move_reductions
+        self.null_move_tries = 0
+        self.null_move_cutoffs = 0  # nodes cut off because passing the turn still beat beta
+        self.reduced_moves = 0  # late quiet moves searched a ply shallower
+        self.reduction_researches = 0  # reduced moves that beat alpha and had to be searched again at full depth
+        self.iterations = []  # one dict per completed depth: depth, nodes, score, move, seconds, ordering stats
+        self.best_move = None
+        self.best_score = 0
+        self.deadline = None
+        self.can_time_out = False  # False until a depth has finished, so there is always a move to play
+        self.stopped = False  # set from another thread by stop() to end the search early
+        self.on_iteration = None  # called with each iteration's dict as soon as that depth finishes, for progress output
+
+    def search(self, game_state, valid_moves):
+        if len(valid_moves) == 0:
+            return None
+        self.nodes_before = self.nodes
+        self.quiescence_before = self.quiescence_nodes
+        if self.stats is None:
+            return self.iterative_deepening(game_state, valid_moves)
+        self.stats.begin(game_state, self.table, self)
+        try:
+            return self.iterative_deepening(game_state, valid_moves)
+        finally:
+            self.stats.finish(game_state, self)
+
+    """
+    Searches depth 1, 2, 3 ... until max_depth, the time limit or stop(), each depth starting with the best move of the
+    one before
+    """
+
+    def iterative_deepening(self, game_state, valid_moves):
+        move_objects = {valid_move.packed: valid_move for valid_move in valid_moves}
+        root_moves = list(move_objects)
+        random.shuffle(root_moves)  # equally good moves get picked at random so games vary
+        self.table.new_search()
+        self.ordering.new_search()
+        entry = self.table.probe(game_state.zobrist_key)
+        self.ordering.order_moves(root_moves, entry[3] if entry is not None else None, 0)  # the sort is stable so ties stay shuffled
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit if self.time_limit is not None else None
+        self.best_move = root_moves[0]
+        self.iterations = []
+        self.can_time_out = False
+        for depth in range(1, self.max_depth + 1):
+            nodes_before = self.nodes
+            quiescence_before = self.quiescence_nodes
+            try:
+                score, move = self.search_root(game_state, root_moves, depth)
+            except search_timeout:
+                break  # keep the move from the last depth that finished
+            self.best_move = move
+            self.best_score = score
+            self.iterations.append({"depth": depth, "nodes": self.nodes - nodes_before,
+                                    "quiescence_nodes": self.quiescence_nodes - quiescence_before, "score": score,
+                                    "move": move_objects[move].get_chess_notation(), "seconds": time.perf_counter() - start,
+                                    "ordering": self.ordering.get_stats(),
+                                    "pv": self.principal_variation(game_state, move, depth)})
+            self.can_time_out = True
+            if self.on_iteration is not None:
+                self.on_iteration(self.iterations[-1])
+            root_moves.remove(move)  # search the best move first next time, it gives the most cut-offs
+            root_moves.insert(0, move)
+            if abs(score) > MATE_BOUND:  # a forced mate was found, deeper won't find a better one
+                break
+        return move_objects[self.best_move]
+
+    """
+    Asks a running search to finish. It unwinds within the next 1024 nodes and search returns the best move so far
+    """
+
+    def stop(self):
+        self.stopped = True
+
+    """
+    The line the search expects, as notation: first_move then the transposition table's best move in each position
+    after it, up to length moves. Stops early where the table has no move or its move isn't legal (a key collision)
+    """
+
+    def principal_variation(self, game_state, first_move, length):
+        line = [first_move]
+        game_state.make_packed_move(first_move)
+        while len(line) < length:
+            entry = self.table.probe(game_state.zobrist_key)
+            if entry is None or entry[3] is None or entry[3] not in game_state.get_packed_moves():
+                break
+            line.append(entry[3])
+            game_state.make_packed_move(entry[3])
+        for packed in line:
+            game_state.undo_move()
+        return [ChessEngine.move.from_packed(packed).get_chess_notation() for packed in line]
+
+    def search_root(self, game_state, root_moves, depth):
+        alpha, best_move = self.search_moves(game_state, root_moves, depth)
+        self.table.store(game_state.zobrist_key, depth, ChessTransposition.EXACT, score_to_table(alpha, 0), best_move)
+        return alpha, best_move
+
+    """
+    Best score and move among some of the root moves. With all of them this is the root search, parallel_search hands
+    each process a share of them
+    """
+
+    def search_moves(self, game_state, root_moves, depth):
+        alpha = -CHECKMATE - 1
+        beta = CHECKMATE + 1
+        best_move = root_moves[0]
+        for player_move in root_moves:
+            game_state.make_packed_move(player_move)
+            try:
+                score = -self.negamax(game_state, depth - 1, -beta, -alpha, 1)
+            finally:  # undo even when the timeout unwinds the stack so the game state is left as it was
+                game_state.undo_move()
+            if score > alpha:
+                alpha = score
+                best_move = player_move
+        return alpha, best_move
+
+    def check_time(self):
+        if self.stopped or self.deadline is not None and self.can_time_out and time.perf_counter() > self.deadline:
+            raise search_timeout()  # depth 1 always finishes unless stopped
+
+    def negamax(self, game_state, depth, alpha, beta, ply, allow_null=True):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+
+        # a position seen before in the game or the search is a draw: if repeating it were best for one side it would
+        # be best again each time round. Checked before the table as the score depends on how the position was reached
+        if game_state.halfmove_clock >= 100 or game_state.repetition_count():
+            self.draw_cutoffs += 1
+            return 0
+
+        if endgame_tables is not None:  # with few enough pieces the exact result is known
+            result = endgame_tables.probe(game_state)
+            if result is not None:
+                return tablebase_score(result, ply)
+
+        # transposition table: a deep enough result is reused, a shallower one still gives a good first move
+        key = game_state.zobrist_key
+        entry = self.table.probe(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry[3]
+            if entry[0] >= depth:
+                score = score_from_table(entry[2], ply)
+                if entry[1] == ChessTransposition.EXACT:
+                    return score
+                elif entry[1] == ChessTransposition.LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        if depth == 0:
+            return self.quiescence(game_state, alpha, beta, ply)
+
+        in_check = (self.null_move or self.late_move_reductions) and depth >= 3 and game_state.in_check()
+        # null move: let the opponent move twice. If a shallower search still can't get below beta the real moves will
+        # do even better, so the node is cut without searching them. Not in check (passing would be illegal), not
+        # twice running, not near mate scores, and not with only pawns left, where having to move can be the worst
+        # thing (zugzwang) and passing would hide it
+        if self.null_move and allow_null and depth >= NULL_MOVE_MIN_DEPTH and not in_check and \
+                abs(beta) < MATE_BOUND and has_pieces(game_state) and score_board(game_state) >= beta:
+            self.null_move_tries += 1
+            reduction = NULL_MOVE_REDUCTION + (1 if depth >= 7 else 0)
+            game_state.make_null_move()
+            try:
+                score = -self.negamax(game_state, max(depth - 1 - reduction, 0), -beta, -beta + 1, ply + 1, False)
+            finally:
+                game_state.undo_null_move()
+            if score >= beta:
+                self.null_move_cutoffs += 1
+                return beta
+
+        moves = game_state.get_packed_moves()
+        if len(moves) == 0:
+            if game_state.check_mate:
+                return -CHECKMATE + ply  # being mated, later mates are less bad
+            return 0  # stalemate
+        self.ordering.order_moves(moves, table_move, ply)
+
+        alpha_original = alpha
+        best_score = -CHECKMATE - 1
+        best_move = None
+        reduce = self.late_move_reductions and depth >= LATE_MOVE_MIN_DEPTH and not in_check
+        for index, player_move in enumerate(moves):
+            game_state.make_packed_move(player_move)
+            try:
+                # late move reduction: moves this far down the ordering rarely turn out best, so quiet ones (not a
+                # capture, promotion or check) get a shallower search with a null window first, and only a move that
+                # beats alpha there is searched properly
+                if reduce and index >= LATE_MOVE_INDEX and not player_move >> 21 and not (player_move >> 14) & 7 \
+                        and not game_state.in_check():
+                    self.reduced_moves += 1
+                    score = -self.negamax(game_state, depth - 2, -alpha - 1, -alpha, ply + 1)
+                    if score > alpha:
+                        self.reduction_researches += 1
+                        score = -self.negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    score = -self.negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                game_state.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = player_move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:  # the opponent won't allow this line, no need to look at the other moves
+                        self.ordering.record_cutoff(player_move, table_move, ply, depth, index)
+                        break
+
+        if best_score <= alpha_original:
+            flag = ChessTransposition.UPPER_BOUND
+        elif best_score >= beta:
+            flag = ChessTransposition.LOWER_BOUND
+        else:
+            flag = ChessTransposition.EXACT
+        self.table.store(key, depth, flag, score_to_table(best_score, ply), best_move)
+        return best_score
+
+
+    """
+    Quiescence search: at the end of the full-width search keep playing captures (and promotions) until the position
+    is quiet, so a piece left hanging or an exchange half done isn't scored as it stands. The side to move can always
+    "stand pat" on the static score instead of capturing. Captures that can't reach alpha even winning the piece
+    (delta pruning) or that lose material by static exchange are skipped. In check every move is searched, since
+    standing pat isn't allowed there
+    """
+
+    def quiescence(self, game_state, alpha, beta, ply):
+        self.quiescence_nodes += 1
+        if self.quiescence_nodes & 1023 == 0:
+            self.check_time()
+        in_check = game_state.in_check()
+        if in_check:
+            moves = game_state.get_packed_moves()
+            if len(moves) == 0:
+                return -CHECKMATE + ply
+            best_score = -CHECKMATE - 1
+        else:
+            best_score = score_board(game_state)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+            moves = [packed for packed in game_state.get_packed_moves(captures_only=True)
+                     if (packed >> 14) & 7 in (0, ChessOrdering.QUEEN_PROMOTION)]  # under-promotions aren't worth it here
+        self.ordering.order_moves(moves, None, ply)
+        stand_pat = best_score
+        for player_move in moves:
+            if not in_check:
+                if stand_pat + packed_captured_value(player_move) + DELTA_MARGIN < alpha:
+                    self.delta_pruned += 1
+                    continue
+                if ChessOrdering.static_exchange(game_state, player_move) < 0:
+                    self.exchange_pruned += 1
+                    continue
+            game_state.make_packed_move(player_move)
+            try:
+                score = -self.quiescence(game_state, -beta, -alpha, ply + 1)
+            finally:
+                game_state.undo_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+
+"""
+Most material a packed capture or promotion can win: the captured piece plus what a pawn gains by promoting
+"""
+
+
+def packed_captured_value(packed):
+    captured = (packed >> 21) & 15
+    value = ChessOrdering.VICTIM_SCORES[captured] // 16
+    if (packed >> 14) & 7:
+        value += ChessEval.PIECE_VALUES['Q'] - ChessEval.PIECE_VALUES['p']
+    return value
+
+
+"""
+A tablebase (result, plies) as a search score at ply, on the same scale as the mates the search finds itself
+"""
+
+
+def tablebase_score(result, ply):
+    outcome, plies = result
+    if outcome > 0:
+        return CHECKMATE - ply - plies
+    if outcome < 0:
+        return -CHECKMATE + ply + plies
+    return 0
+
+
+"""
+Mate scores are stored relative to the position rather than the root, so they stay right when the same position is
+found at a different ply
+"""
+
+
+def score_to_table(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+"""
+Root splitting over a pool of processes. Each depth of the iterative deepening deals the ordered root moves out
+round-robin, so every process gets some of the likely best moves, and each process searches its share with its own
+transposition table and move ordering (module globals in that process, kept between depths and moves). The best of
+the shares is the best move, the same as negamax_search would pick. Processes can't see each other's alpha so some
+pruning is lost, which is why the speedup is less than the number of processes. The processes are started on the first
+search and kept for the next, so use one for a whole game (game_parallel_search) and call close() when done with it
+"""
+
+
+class parallel_search():
+    def __init__(self, max_depth=MAX_DEPTH, time_limit=TIME_LIMIT, workers=None):
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.pool = None
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.iterations = []  # as negamax_search, without ordering stats since those stay in the processes
+        self.best_move = None
+        self.best_score = 0
+        self.stopped = False
+
+    def search(self, game_state, valid_moves):
+        if len(valid_moves) == 0:
+            return None
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        self.nodes = self.quiescence_nodes = 0  # counts are for this move, like a new negamax_search's
+        self.best_score = 0
+        move_objects = {valid_move.packed: valid_move for valid_move in valid_moves}
+        root_moves = list(move_objects)
+        random.shuffle(root_moves)
+        entry = transposition_table.probe(game_state.zobrist_key)
+        move_ordering.order_moves(root_moves, entry[3] if entry is not None else None, 0)
+        start = time.perf_counter()
+        self.best_move = root_moves[0]
+        self.iterations = []
+        for depth in range(1, self.max_depth + 1):
+            shares = [root_moves[index::self.workers] for index in range(min(self.workers, len(root_moves)))]
+            # depth 1 has no time limit so there is always a move, like negamax_search
+            time_left = None
+            if self.time_limit is not None and depth > 1:
+                time_left = start + self.time_limit - time.perf_counter()
+            snapshot = game_state.snapshot()  # a few hundred bytes to send rather than the game with its history
+            pending = self.pool.map_async(search_share, [(snapshot, share, depth, time_left) for share in shares])
+            while not pending.ready():
+                pending.wait(0.05)
+                if self.stopped:
+                    self.close()  # the processes can't be told to stop part way, so they are ended
+                    return move_objects[self.best_move]
+            results = pending.get()
+            self.nodes += sum(result[2] for result in results)
+            self.quiescence_nodes += sum(result[3] for result in results)
+            if any(result[0] is None for result in results):
+                break  # a share ran out of time, keep the move from the last depth that finished
+            score, move = max(results, key=lambda result: result[0])[:2]
+            self.best_move = move
+            self.best_score = score
+            self.iterations.append({"depth": depth, "nodes": sum(result[2] for result in results),
+                                    "quiescence_nodes": sum(result[3] for result in results), "score": score,
+                                    "move": move_objects[move].get_chess_notation(),
+                                    "seconds": time.perf_counter() - start})
+            for result in sorted(results, key=lambda result: result[0]):  # each share's best goes first, best overall first of all
+                root_moves.remove(result[1])
+                root_moves.insert(0, result[1])
+            if abs(score) > MATE_BOUND:
+                break
+        return move_objects[self.best_move]
+
+    def stop(self):
+        self.stopped = True
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+"""
+Runs in a parallel_search process: rebuilds the position from its snapshot, searches a share of the root moves to
+depth and returns (score, best move, nodes, quiescence nodes). The score is None if time_left ran out first
+"""
+
+
+def search_share(task):
+    snapshot, root_moves, depth, time_left = task
+    game_state = ChessEngine.game_state.__new__(ChessEngine.game_state)
+    game_state.use_bitboards = True
+    game_state.restore(snapshot)
+    search = negamax_search(depth)
+    if time_left is not None:
+        search.deadline = time.perf_counter() + time_left
+        search.can_time_out = True
+    if depth == 1:
+        transposition_table.new_search()
+        move_ordering.new_search()
+    try:
+        score, move = search.search_moves(game_state, root_moves, depth)
+    except search_timeout:
+        return None, None, search.nodes, search.quiescence_nodes
+    return score, move, search.nodes, search.quiescence_nodes
+
+
+"""
+Times the same search with one process and with each number of processes in worker_counts. Returns one dict per run
+with the workers, seconds, nodes, move, score and speedup over the serial search. The transposition table is cleared
+before each run so none of them starts with the others' results
+"""
+
+
+def measure_speedup(game_state, depth, worker_counts):
+    runs = []
+    for workers in [1] + [count for count in worker_counts if count != 1]:
+        transposition_table.clear()
+        searcher = negamax_search(depth) if workers == 1 else parallel_search(depth, workers=workers)
+        start = time.perf_counter()
+        move = searcher.search(game_state, game_state.get_valid_moves())
+        seconds = time.perf_counter() - start
+        if workers != 1:
+            searcher.close()
+        runs.append({"workers": workers, "seconds": seconds, "nodes": searcher.nodes + searcher.quiescence_nodes,
+                     "move": move.get_chess_notation(), "score": searcher.best_score,
+                     "speedup": runs[0]["seconds"] / seconds if runs and seconds > 0 else 1.0})
+    return runs
+
+
+last_search = None  # the negamax_search behind the last find_best_move, for its node counts
+game_search = None  # the parallel_search kept for the game, its processes hold their tables between moves
+
+
+"""
+The parallel_search for the game, made the first time and reused after that so its processes aren't started again for
+every move. Settings for a different number of workers start a new one
+"""
+
+
+def game_parallel_search(max_depth, time_limit, workers):
+    global game_search
+    if game_search is None or game_search.workers != workers:
+        close_game_search()
+        game_search = parallel_search(max_depth, time_limit, workers)
+    game_search.max_depth = max_depth
+    game_search.time_limit = time_limit
+    game_search.stopped = False
+    return game_search
+
+
+"""
+Ends the game's search processes, at the end of a game or before a new one so the next doesn't start with its tables
+"""
+
+
+def close_game_search():
+    global game_search
+    if game_search is not None:
+        game_search.close()
+        game_search = None
+
+
+"""
+A move from opening_book for the position, or None if there's no book or the position isn't in it
+"""
+
+
+def book_move(game_state, valid_moves):
+    if opening_book is None:
+        return None
+    return opening_book.choose_move(game_state, valid_moves)
+
+
+"""
+The best move by the endgame tables, or None if there are none or the position isn't in them. Wins take the quickest
+mate and losses the slowest, every reply is looked up so it costs one probe per move and no search
+"""
+
+
+def tablebase_move(game_state, valid_moves):
+    if endgame_tables is None or endgame_tables.probe(game_state) is None:
+        return None
+    best_move = None
+    best_score = -CHECKMATE - 1
+    for player_move in valid_moves:
+        game_state.make_move(player_move)
+        result = endgame_tables.probe(game_state)
+        game_state.undo_move()
+        if result is None:
+            continue  # a pawn promoting to a piece without a table
+        score = -tablebase_score(result, 1)
+        if score > best_score:
+            best_score = score
+            best_move = player_move
+    return best_move
+
+
+"""
+A move that needs no search: from the opening book or the endgame tables, or None
+"""
+
+
+def known_move(game_state, valid_moves):
+    move = book_move(game_state, valid_moves)
+    if move is None:
+        move = tablebase_move(game_state, valid_moves)
+    return move
+
+
+"""
+Best move for the player to move searching up to max_depth plies or for time_limit seconds, whichever comes first.
+workers above 1 searches with that many processes (parallel_search)
+"""
+
+
+def find_best_move(game_state, valid_moves, max_depth=MAX_DEPTH, time_limit=TIME_LIMIT, workers=1):
+    global last_search
+    move = known_move(game_state, valid_moves)
+    if move is not None:
+        last_search = None
+        return move
+    if workers > 1:
+        last_search = game_parallel_search(max_depth, time_limit, workers)
+        return last_search.search(game_state, valid_moves)
+    last_search = negamax_search(max_depth, time_limit)
+    return last_search.search(game_state, valid_moves)
+
+
+"""
+Runs find_best_move in a background thread on a copy of the position, so the window keeps handling events and drawing
+while the AI thinks. Poll done() each frame and read move once it's True, or cancel() to throw the search away
+"""
+
+
+class ai_worker():
+    def __init__(self, game_state, valid_moves, max_depth=MAX_DEPTH, time_limit=TIME_LIMIT, workers=1):
+        if workers <= 1:
+            self.search = negamax_search(max_depth, time_limit)
+        else:
+            self.search = game_parallel_search(max_depth, time_limit, workers)
+        self.move = None
+        # the search makes and undoes moves as it goes, so it gets its own copy rather than the board being drawn
+        self.thread = threading.Thread(target=self.run, args=(game_state.clone(), list(valid_moves)), daemon=True)
+        self.thread.start()
+
+    def run(self, game_state, valid_moves):
+        global last_search
+        last_search = self.search
+        self.move = known_move(game_state, valid_moves)
+        if self.move is not None:
+            return
+        self.move = self.search.search(game_state, valid_moves)
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    """
+    Stops the search and waits for the thread to end, so the shared transposition table and move ordering are free
+    before another search starts
+    """
+
+    def cancel(self):
+        self.search.stop()
+        self.thread.join()
+
+
+"""
+Material and piece-square score in centipawns from white's point of view. game_state keeps the totals up to date as
+moves are made and undone so this is a read rather than a scan of the board
+"""
+
+
+def white_score(game_state):
+    if game_state.stats is not None:
+        game_state.stats.evaluations += 1
+    if ChessEval.DEBUG:
+        ChessEval.check_score(game_state)
+    return game_state.material_score + game_state.position_score
+
+
+"""
+Whether the player to move has a knight, bishop, rook or queen. With only king and pawns zugzwang is common, so the
+search doesn't try null moves there
+"""
+
+
+def has_pieces(game_state):
+    bitboards = game_state.bitboards
+    colour = 'w' if game_state.white_turn else 'b'
+    return bool(bitboards[colour + 'N'] | bitboards[colour + 'B'] | bitboards[colour + 'R'] | bitboards[colour + 'Q'])
+
+
+"""
+Board score from the point of view of the player to move
+"""
+
+
+def score_board(game_state):
+    if game_state.white_turn:
+        return white_score(game_state)
+    return -white_score(game_state)
+
+
+"""
+Speedup report for parallel_search, for example: python ChessAI.py --depth 5 --workers 2 4 8
+"""
+
+
+def main():
+    import argparse
+    import ChessStats
+    parser = argparse.ArgumentParser(description="Time the search with different numbers of processes")
+    parser.add_argument("--depth", type=int, default=MAX_DEPTH, help="depth to search to")
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count() or 1], help="process counts to try")
+    parser.add_argument("--fen", default=ChessEngine.STARTING_FEN, help="position to search")
+    parser.add_argument("--stats", action="store_true", help="search once with one process and print its stats")
+    parser.add_argument("--profile", action="store_true", help="search once with one process under cProfile")
+    args = parser.parse_args()
+    if args.stats or args.profile:
+        game_state = ChessEngine.game_state(fen=args.fen)
+        stats = ChessStats.search_stats()
+        search = negamax_search(args.depth, stats=stats)
+        if args.profile:
+            move = ChessStats.profile(search.search, game_state, game_state.get_valid_moves())
+        else:
+            move = search.search(game_state, game_state.get_valid_moves())
+        print("best move", move.get_chess_notation(), "score", search.best_score)
+        print(stats.to_json())
+        return
+    for run in measure_speedup(ChessEngine.game_state(fen=args.fen), args.depth, args.workers):
+        print("%2d workers  %7.2fs  %9d nodes  %s %6d  speedup %.2f" % (
+            run["workers"], run["seconds"], run["nodes"], run["move"], run["score"], run["speedup"]))
+
+
+if __name__ == "__main__":
+    main()
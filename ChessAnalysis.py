@@ -0,0 +1,208 @@
+"""
+Analyses the games in a PGN file with the engine. Games are read one at a time (ChessPGN.read_games), each is replayed
+and every position searched to a fixed depth in a pool of processes, and the results are written out as they come in:
+one JSON object per game (JSONL), or the PGN again with the scores as comments and blunders marked. Only a few games
+are in flight at once, so memory stays the same however big the file is, and games are spread across every core.
+
+A move's loss is how much worse it scored than the engine's choice, from the side that played it. Losses from
+MISTAKE_LOSS are marked "?" and from BLUNDER_LOSS "??".
+
+    python ChessAnalysis.py games.pgn --depth 3 --output analysis.jsonl
+    python ChessAnalysis.py games.pgn --format pgn --output annotated.pgn --workers 4
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import ChessAI
+import ChessPGN
+
+DEFAULT_DEPTH = 3
+MISTAKE_LOSS = 100  # centipawns
+BLUNDER_LOSS = 250
+SCORE_CAP = 2000  # mate scores count as this much when working out a loss, so missing a mate isn't a huge number
+
+
+"""
+Score of the position from the point of view of the player to move and the engine's move, searching to depth. A
+finished game has no move and scores as mated or drawn
+"""
+
+
+def evaluate_position(game_state, depth):
+    valid_moves = game_state.get_move_index().moves
+    if not valid_moves:
+        return (-ChessAI.CHECKMATE if game_state.check_mate else 0), None
+    if game_state.draw_reason() is not None:
+        return 0, None
+    search = ChessAI.negamax_search(depth)
+    best_move = search.search(game_state, valid_moves)
+    return search.best_score, best_move
+
+
+def capped(score):
+    return max(-SCORE_CAP, min(SCORE_CAP, score))
+
+
+"""
+Score from white's point of view as text: "+0.35" in pawns, "#3" / "#-3" for white or black mating in that many moves,
+or "#" once the mate is on the board
+"""
+
+
+def score_text(score):
+    if abs(score) == ChessAI.CHECKMATE:
+        return "#"
+    if score > ChessAI.MATE_BOUND:
+        return "#%d" % ((ChessAI.CHECKMATE - score + 1) // 2)
+    if score < -ChessAI.MATE_BOUND:
+        return "#-%d" % ((ChessAI.CHECKMATE + score + 1) // 2)
+    return "%+.2f" % (score / 100)
+
+
+"""
+Replays one game and searches every position in it. task is (headers, sans, result, depth). Returns the game's record:
+its headers and result, whether every move could be read, why not if its FEN tag couldn't be (error, None otherwise),
+and one dict per move with the move played, the score after it from white's point of view, the engine's choice, the
+loss and the mistake/blunder marks
+"""
+
+
+def analyse_game(task):
+    headers, sans, result, depth = task
+    ChessAI.transposition_table.clear()  # games don't share positions often enough to be worth the stale entries
+    moves = []
+    score = best_move = None
+    try:
+        start = ChessPGN.start_position(headers)
+    except ValueError as error:  # one broken game mustn't stop the rest of the file
+        return {"headers": headers, "result": result, "complete": False, "error": str(error), "moves": []}
+    for game_state, move in ChessPGN.play_moves(start, sans):
+        if score is None:  # after the first move the last search already scored this position
+            score, best_move = evaluate_position(game_state, depth)
+        valid_moves = game_state.get_move_index().moves
+        played = {"ply": len(moves) + 1, "san": ChessPGN.move_to_san(game_state, move, valid_moves),
+                  "move": move.get_chess_notation(), "white": game_state.white_turn,
+                  "best_san": ChessPGN.move_to_san(game_state, best_move, valid_moves) if best_move is not None else None,
+                  "best_score": score}
+        moves.append(played)
+        game_state.make_move(move)
+        next_score, next_best = evaluate_position(game_state, depth)
+        game_state.undo_move()  # play_moves makes the move itself once this loop comes round again
+        if best_move is not None and move.packed == best_move.packed:
+            played["loss"] = 0  # the scores can still differ a little, the second search sees a ply further
+        else:
+            played["loss"] = max(0, capped(score) + capped(next_score))
+        played["score"] = -next_score if played["white"] else next_score  # the next player's score, turned round
+        played["mistake"] = played["loss"] >= MISTAKE_LOSS
+        played["blunder"] = played["loss"] >= BLUNDER_LOSS
+        score, best_move = next_score, next_best
+    return {"headers": headers, "result": result, "complete": len(moves) == len(sans), "error": None, "moves": moves}
+
+
+"""
+Yields the record of each game in games (as from ChessPGN.read_games) in order, analysed on workers processes. At most
+max_pending games are handed to the pool ahead of the one being waited for, which bounds memory whatever the input
+"""
+
+
+def analyse_games(games, depth=DEFAULT_DEPTH, workers=None, max_pending=None):
+    workers = workers if workers is not None else os.cpu_count() or 1
+    tasks = ((headers, sans, result, depth) for headers, sans, result in games)
+    if workers == 1:
+        for task in tasks:
+            yield analyse_game(task)
+        return
+    max_pending = max_pending or workers * 2
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(analyse_game, (task,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+"""
+The game as PGN with each move's score as a comment, "?" and "??" on mistakes and blunders and the engine's choice
+after them
+"""
+
+
+def annotate_pgn(record):
+    lines = ['[%s "%s"]' % (tag, value) for tag, value in record["headers"].items()]
+    fen = record["headers"].get("FEN", "").split() if record["moves"] else []  # an unreadable FEN has no moves
+    first_number = int(fen[5]) if len(fen) > 5 else 1
+    black_first = 1 if len(fen) > 1 and fen[1] == "b" else 0
+    tokens = ["{" + record["error"] + "}"] if record.get("error") else []
+    for played in record["moves"]:
+        if played["white"] or not tokens:
+            move_number = first_number + (played["ply"] - 1 + black_first) // 2
+            tokens.append("%d.%s" % (move_number, "" if played["white"] else ".."))
+        mark = "??" if played["blunder"] else "?" if played["mistake"] else ""
+        comment = score_text(played["score"])
+        if mark and played["best_san"] is not None:
+            comment += ", best " + played["best_san"]
+        tokens.append(played["san"] + mark)
+        tokens.append("{" + comment + "}")
+    tokens.append(record["result"])
+    movetext = []
+    line = ""
+    for token in tokens:  # PGN lines are kept under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            movetext.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    movetext.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+
+"""
+Analyses every game in pgn_path and writes the records to output as they finish, as JSONL or annotated PGN. Returns
+(games, moves) analysed
+"""
+
+
+def analyse_file(pgn_path, output, depth=DEFAULT_DEPTH, workers=None, output_format="jsonl"):
+    games = moves = 0
+    with open(pgn_path, encoding="utf-8-sig", errors="replace") as pgn:
+        for record in analyse_games(ChessPGN.read_games(pgn), depth, workers):
+            if output_format == "pgn":
+                output.write(annotate_pgn(record))
+            else:
+                output.write(json.dumps(record) + "\n")
+            output.flush()
+            games += 1
+            moves += len(record["moves"])
+    return games, moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every move of the games in a PGN file")
+    parser.add_argument("pgn")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="search depth for each position")
+    parser.add_argument("--workers", type=int, default=None, help="processes to analyse with, default every core")
+    parser.add_argument("--format", choices=("jsonl", "pgn"), default="jsonl", help="one JSON line per game, or PGN")
+    parser.add_argument("--output", default=None, help="file to write to, default the screen")
+    args = parser.parse_args()
+    output = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        games, moves = analyse_file(args.pgn, output, args.depth, args.workers, args.format)
+    finally:
+        if args.output:
+            output.close()
+    seconds = time.perf_counter() - start
+    print("%d games, %d moves in %.1fs, %.1f moves/s" % (games, moves, seconds, moves / seconds if seconds > 0 else 0.0),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
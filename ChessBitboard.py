@@ -0,0 +1,214 @@
+"""
+Bitboard tables and attack functions used by the game_state move generator. Every square is numbered row * 8 + file
+(so a8 is square 0 and h1 is square 63, the same way round as game_state.board) and a set of squares is stored as a
+single 64-bit python int where bit n is square n.
+"""
+
+FULL_BOARD = (1 << 64) - 1
+SQUARE_BITS = [1 << sq for sq in range(64)]  # lookup so we don't have to shift every time
+COORDINATES = [divmod(sq, 8) for sq in range(64)]  # square number back to (row, file)
+
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL_BOARD ^ FILE_A
+NOT_FILE_H = FULL_BOARD ^ FILE_H
+ROW_MASKS = [0xFF << (r * 8) for r in range(8)]  # row 0 is the 8th rank
+
+# the 8 ray directions as (row step, file step), rook directions first then bishop directions
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+"""
+Squares reached by single steps (knight or king) from every square
+"""
+
+
+def step_attack_table(steps):
+    table = []
+    for sq in range(64):
+        row, file = divmod(sq, 8)
+        attacks = 0
+        for step in steps:
+            last_row = row + step[0]
+            last_file = file + step[1]
+            if 0 <= last_row < 8 and 0 <= last_file < 8:
+                attacks |= 1 << (last_row * 8 + last_file)
+        table.append(attacks)
+    return table
+
+
+"""
+Every square along a direction from every square, not including the starting square
+"""
+
+
+def ray_table(direction):
+    table = []
+    for sq in range(64):
+        row, file = divmod(sq, 8)
+        ray = 0
+        row += direction[0]
+        file += direction[1]
+        while 0 <= row < 8 and 0 <= file < 8:
+            ray |= 1 << (row * 8 + file)
+            row += direction[0]
+            file += direction[1]
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = step_attack_table(KNIGHT_JUMPS)
+KING_ATTACKS = step_attack_table(KING_STEPS)
+RAYS = {direction: ray_table(direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+
+# pawn captures indexed by colour then square, e.g. PAWN_ATTACKS['w'][sq] are the squares a white pawn on sq attacks
+PAWN_ATTACKS = {'w': step_attack_table(((-1, -1), (-1, 1))), 'b': step_attack_table(((1, -1), (1, 1)))}
+
+
+"""
+Attacks of a slider from sq along the given directions, stopping at (and including) the first piece in each direction
+"""
+
+
+def slide(sq, occupied, directions):
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if direction[0] * 8 + direction[1] > 0:  # ray goes towards higher squares so the nearest blocker is the lowest bit
+                nearest = (blockers & -blockers).bit_length() - 1
+            else:  # ray goes towards lower squares so the nearest blocker is the highest bit
+                nearest = blockers.bit_length() - 1
+            ray ^= RAYS[direction][nearest]  # remove everything behind the blocker
+        attacks |= ray
+    return attacks
+
+
+"""
+Relevant occupancy masks: only pieces on these squares can change a slider's attacks. The last square of every ray is
+left out because whether it is empty or not it is always attacked
+"""
+
+
+def relevant_mask(sq, directions):
+    mask = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        row, file = divmod(sq, 8)
+        while 0 <= row + direction[0] < 8 and 0 <= file + direction[1] < 8:
+            row += direction[0]
+            file += direction[1]
+        mask |= ray & ~(1 << (row * 8 + file))
+    return mask
+
+
+ROOK_MASKS = [relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+# attack sets are filled in the first time an occupancy is seen, acting like a magic bitboard table but with a dict
+ROOK_TABLES = [{} for sq in range(64)]
+BISHOP_TABLES = [{} for sq in range(64)]
+
+
+"""
+Squares a rook on sq attacks given all occupied squares
+"""
+
+
+def rook_attacks(sq, occupied):
+    key = occupied & ROOK_MASKS[sq]
+    table = ROOK_TABLES[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = slide(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+"""
+Squares a bishop on sq attacks given all occupied squares
+"""
+
+
+def bishop_attacks(sq, occupied):
+    key = occupied & BISHOP_MASKS[sq]
+    table = BISHOP_TABLES[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = slide(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def queen_attacks(sq, occupied):
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+"""
+Yields the square number of every set bit, lowest first
+"""
+
+
+def squares(bitboard):
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def pop_count(bitboard):
+    return bin(bitboard).count("1")
+
+
+"""
+Squares strictly between two squares on the same row, file or diagonal (0 if they don't line up)
+"""
+
+
+def between_table():
+    table = [[0] * 64 for sq in range(64)]
+    for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        for sq in range(64):
+            between = 0
+            for last_sq in squares(RAYS[direction][sq]) if direction[0] * 8 + direction[1] > 0 else \
+                    reversed(list(squares(RAYS[direction][sq]))):  # walk outwards from sq
+                table[sq][last_sq] = between
+                between |= 1 << last_sq
+    return table
+
+
+BETWEEN = between_table()
+# attacks on an empty board, used to find sliders that could pin something against the king
+ROOK_RAYS = [slide(sq, 0, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_RAYS = [slide(sq, 0, BISHOP_DIRECTIONS) for sq in range(64)]
+
+
+"""
+All pieces of colour ('w' or 'b') attacking sq, as a bitboard. occupied is passed in so callers can look through
+pieces that are about to move (e.g. the king stepping along a slider's line)
+"""
+
+
+def attackers_to(bitboards, sq, colour, occupied):
+    enemy = 'b' if colour == 'w' else 'w'
+    return (PAWN_ATTACKS[enemy][sq] & bitboards[colour + 'p']) | \
+        (KNIGHT_ATTACKS[sq] & bitboards[colour + 'N']) | \
+        (KING_ATTACKS[sq] & bitboards[colour + 'K']) | \
+        (bishop_attacks(sq, occupied) & (bitboards[colour + 'B'] | bitboards[colour + 'Q'])) | \
+        (rook_attacks(sq, occupied) & (bitboards[colour + 'R'] | bitboards[colour + 'Q']))
+
+
+"""
+True if any piece of colour attacks sq, cheapest tests first so most calls return early
+"""
+
+
+def is_attacked(bitboards, sq, colour, occupied):
+    enemy = 'b' if colour == 'w' else 'w'
+    if KNIGHT_ATTACKS[sq] & bitboards[colour + 'N'] or PAWN_ATTACKS[enemy][sq] & bitboards[colour + 'p'] or \
+            KING_ATTACKS[sq] & bitboards[colour + 'K']:
+        return True
+    if bishop_attacks(sq, occupied) & (bitboards[colour + 'B'] | bitboards[colour + 'Q']):
+        return True
+    return rook_attacks(sq, occupied) & (bitboards[colour + 'R'] | bitboards[colour + 'Q']) != 0
@@ -0,0 +1,158 @@
+"""
+Opening book. The book is a file of 16-byte entries in the Polyglot layout (big-endian 64-bit position key, 16-bit move,
+16-bit weight, 32-bit learn field) sorted by key. It is read through mmap and looked up with a binary search, so
+opening a book costs nothing however big it is and a lookup only touches a few pages.
+
+Keys are game_state.zobrist_key rather than Polyglot's own random numbers, so books for this engine are built from PGN
+with build_book and books made by other programs won't match:
+    python ChessBook.py build games.pgn book.bin --depth 20     book of the first 20 plies of every game
+    python ChessBook.py probe "<fen>" book.bin                  book moves and weights for a position
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+
+import ChessEngine
+import ChessPGN
+
+ENTRY = struct.Struct(">QHHI")
+MAX_WEIGHT = 0xFFFF
+DEFAULT_BOOK_DEPTH = 20  # plies into the game the book is followed (or built) for
+
+
+"""
+A move's 16-bit book form: bits 0-2 to file, 3-5 to rank, 6-8 from file, 9-11 from rank, 12-14 promotion piece (1 to 4
+for knight to queen, the same order as ChessEngine.PROMOTION_TYPES). Ranks count from white's side, and castling is
+written as the king taking its own rook, as in Polyglot
+"""
+
+
+def encode_move(move):
+    last_file = move.last_file
+    if move.is_castle_move:
+        last_file = 7 if move.last_file > move.first_file else 0
+    promotion = ChessEngine.PROMOTION_TYPES.index(move.promotion_piece)
+    return last_file | (7 - move.last_row) << 3 | move.first_file << 6 | (7 - move.initial_row) << 9 | promotion << 12
+
+
+class opening_book():
+    def __init__(self, path, max_depth=DEFAULT_BOOK_DEPTH):
+        self.path = path
+        self.max_depth = max_depth  # positions more than this many plies into the game are left to the search
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""  # an empty file can't be mapped
+        self.entries = size // ENTRY.size
+
+    """
+    The (encoded move, weight) pairs stored for a key, found by binary search for its first entry
+    """
+
+    def get_entries(self, key):
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.entries:
+            entry_key, book_move, weight, learn = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((book_move, weight))
+            low += 1
+        return found
+
+    """
+    The book moves for the position as (move, weight) with move one of valid_moves. Book moves that aren't legal here
+    (another position with the same key) are left out
+    """
+
+    def get_moves(self, game_state, valid_moves):
+        by_code = {encode_move(valid_move): valid_move for valid_move in valid_moves}
+        return [(by_code[book_move], weight) for book_move, weight in self.get_entries(game_state.zobrist_key)
+                if book_move in by_code and weight > 0]
+
+    """
+    A book move picked at random with chance in proportion to its weight, or None when the position isn't in the book
+    or the game is past max_depth
+    """
+
+    def choose_move(self, game_state, valid_moves, rng=random):
+        ply = (game_state.fullmove_number - 1) * 2 + (0 if game_state.white_turn else 1)
+        if ply >= self.max_depth:
+            return None
+        book_moves = self.get_moves(game_state, valid_moves)
+        if not book_moves:
+            return None
+        pick = rng.randrange(sum(weight for book_move, weight in book_moves))
+        for book_move, weight in book_moves:
+            pick -= weight
+            if pick < 0:
+                return book_move
+
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.file.close()
+
+
+"""
+Builds a book from the games in a PGN file, every position in their first max_depth plies with the moves played from
+it, weighted by how often each was played. Games whose FEN tag can't be read are left out. Returns the number of
+entries written
+"""
+
+
+def build_book(pgn_path, book_path, max_depth=DEFAULT_BOOK_DEPTH):
+    counts = {}
+    with open(pgn_path, encoding="utf-8-sig", errors="replace") as pgn:  # archives aren't always UTF-8
+        for headers, sans, result in ChessPGN.read_games(pgn):
+            try:
+                start = ChessPGN.start_position(headers)
+            except ValueError:
+                continue
+            for game_state, move in ChessPGN.play_moves(start, sans[:max_depth]):
+                entry = (game_state.zobrist_key, encode_move(move))
+                counts[entry] = counts.get(entry, 0) + 1
+    largest = {}  # a key's weights are scaled together so the most played move stays the most played when capped
+    for (key, book_move), count in counts.items():
+        largest[key] = max(largest.get(key, 0), count)
+    with open(book_path, "wb") as book:
+        for (key, book_move) in sorted(counts):
+            weight = counts[(key, book_move)]
+            if largest[key] > MAX_WEIGHT:
+                weight = max(1, weight * MAX_WEIGHT // largest[key])
+            book.write(ENTRY.pack(key, book_move, weight, 0))
+    return len(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or look up an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="make a book from a PGN file")
+    build.add_argument("pgn")
+    build.add_argument("book")
+    build.add_argument("--depth", type=int, default=DEFAULT_BOOK_DEPTH, help="plies of each game to put in the book")
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("fen")
+    probe.add_argument("book")
+    args = parser.parse_args()
+    if args.command == "build":
+        print("%d entries written to %s" % (build_book(args.pgn, args.book, args.depth), args.book))
+        return
+    book = opening_book(args.book, sys.maxsize)
+    game_state = ChessEngine.game_state(fen=args.fen)
+    for book_move, weight in sorted(book.get_moves(game_state, game_state.get_valid_moves()), key=lambda pair: -pair[1]):
+        print(book_move.get_chess_notation(), weight)
+    book.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,181 +3,514 @@ This class is responsible for storing all the information about the current stat
 responsible for determining the valid moves at the current state. It will also keep a move Log.
 """
 
+import time
+
+import ChessBitboard
+import ChessEval
+import ChessZobrist
+from ChessBitboard import COORDINATES, FULL_BOARD, NOT_FILE_A, NOT_FILE_H, ROW_MASKS, SQUARE_BITS
+
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+
+# Moves are packed into one int inside the generator and search so that no objects are created per move:
+#   bits 0-5 from square, 6-11 to square, 12-13 flag, 14-16 promotion piece, 17-20 piece moved, 21-24 piece captured
+# squares are row * 8 + file like the bitboards, pieces are their index in PIECES (captured is index + 1, 0 for none)
+NORMAL_FLAG = 0
+ENPASSANT_FLAG = 1
+CASTLE_FLAG = 2
+DOUBLE_PUSH_FLAG = 3
+PROMOTION_TYPES = (None, 'N', 'B', 'R', 'Q')  # the promotion field indexes this
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+MOVED_BITS = {piece: code << 17 for piece, code in PIECE_CODES.items()}
+CAPTURED_BITS = dict({piece: (code + 1) << 21 for piece, code in PIECE_CODES.items()}, E=0)
+PROMOTION_BITS = [code << 14 for code in (4, 3, 2, 1)]  # queen first as it is nearly always the best
+PROMOTION_ID_OFFSETS = {None: 0, 'Q': 0, 'R': 10000, 'B': 20000, 'N': 30000}  # keeps move_IDs unique, queening keeps the plain ID
+
+# Each move made leaves one int on the undo stack with everything undo_move can't work out from the move itself:
+#   bits 0-24 the packed move (which has the captured piece), 25-28 castle mask, 29-32 en passant file + 1 (0 for none),
+#   33-48 halfmove clock, 49 up the zobrist key, all from before the move. Undo puts them back rather than reversing
+#   anything, so it can't drift from the position the move was made in
+MOVE_MASK = (1 << 25) - 1
+UNDO_RIGHTS_SHIFT = 25
+UNDO_ENPASSANT_SHIFT = 29
+UNDO_CLOCK_SHIFT = 33
+UNDO_KEY_SHIFT = 49
+UNDO_STACK_SIZE = 256  # slots made up front, doubled if a game goes on longer
+NULL_MOVE = MOVE_MASK  # the move field of a null move's record, no real move has every bit set
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# FEN letters are upper case for white and lower case for black, and pawns are 'p' on the board whatever the colour
+FEN_PIECES = {(piece[1].upper() if piece[0] == 'w' else piece[1].lower()): piece for piece in PIECES}
+PIECE_LETTERS = {piece: letter for letter, piece in FEN_PIECES.items()}
+SQUARE_CODES = dict({piece: code + 1 for piece, code in PIECE_CODES.items()}, E=0)  # one byte per square in a snapshot
+SQUARE_PIECES = ("E",) + PIECES
+
+
 class game_state():
-    def __init__(self):
+    def __init__(self, use_bitboards=True, fen=None):
+        self.use_bitboards = use_bitboards  # False falls back to scanning the board list square by square
+        self.check_mate = False
+        self.stale_mate = False
+        self.load_fen(fen if fen is not None else STARTING_FEN)
+
+    """
+    Sets up the position described by a FEN (Forsyth-Edwards Notation) string, forgetting any moves made before. The
+    castling, en passant and move counter fields can be left off. Raises ValueError for a FEN that can't be read.
+    Castling rights without the king and rook on their starting squares, and an en passant square without a pawn that
+    could just have moved past it, are dropped rather than refused, since other programs write them. A position where
+    the side not to move is in check is refused, the king could be taken
+    """
+
+    def load_fen(self, fen):
+        fields = fen.split()
+        if not 2 <= len(fields) <= 6:
+            raise ValueError("FEN needs 2 to 6 fields, not %d: %r" % (len(fields), fen))
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks, not %d: %r" % (len(ranks), fen))
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char in "12345678":
+                    row.extend(["E"] * int(char))
+                elif char in FEN_PIECES:
+                    row.append(FEN_PIECES[char])
+                else:
+                    raise ValueError("FEN board has %r, which isn't a piece: %r" % (char, fen))
+            if len(row) != 8:
+                raise ValueError("FEN rank %r isn't 8 squares: %r" % (rank, fen))
+            board.append(row)
+        for king in ("wK", "bK"):
+            if sum(row.count(king) for row in board) != 1:
+                raise ValueError("FEN needs one king of each colour: %r" % fen)
+        if any(piece in ("wp", "bp") for piece in board[0] + board[7]):
+            raise ValueError("FEN has a pawn on the first or last rank: %r" % fen)
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be w or b: %r" % fen)
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-" and (not castling or any(char not in "KQkq" for char in castling)):
+            raise ValueError("FEN castling must be - or letters from KQkq: %r" % fen)
+        enpassant_field = fields[3] if len(fields) > 3 else "-"
+        if enpassant_field != "-" and (len(enpassant_field) != 2 or enpassant_field[0] not in "abcdefgh" or
+                                       enpassant_field[1] not in "36"):
+            raise ValueError("FEN en passant square must be - or on the third or sixth rank: %r" % fen)
+        try:
+            halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+            fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("FEN move counters must be numbers: %r" % fen) from None
+        if halfmove_clock < 0 or fullmove_number < 1:
+            raise ValueError("FEN move counters out of range: %r" % fen)
+        white_home = board[7][4] == "wK"
+        black_home = board[0][4] == "bK"
+        rights = castle_rights('K' in castling and white_home and board[7][7] == "wR",
+                               'Q' in castling and white_home and board[7][0] == "wR",
+                               'k' in castling and black_home and board[0][7] == "bR",
+                               'q' in castling and black_home and board[0][0] == "bR")
+        enpassant = ()
+        if enpassant_field != "-":
+            row, file = 8 - int(enpassant_field[1]), ord(enpassant_field[0]) - ord('a')
+            if fields[1] == 'w':  # black's pawn went from row 1 past this square to row 3
+                pawn_row, pawn, start_row = row + 1, "bp", row - 1
+            else:
+                pawn_row, pawn, start_row = row - 1, "wp", row + 1
+            if row == (2 if fields[1] == 'w' else 5) and board[pawn_row][file] == pawn and \
+                    board[row][file] == "E" and board[start_row][file] == "E":
+                enpassant = (row, file)
+        self.set_position(board, fields[1] == 'w', rights, enpassant, halfmove_clock, fullmove_number)
+        self.make_null_move()
+        king_capturable = self.in_check()  # the side that isn't to move can't be left in check
+        self.undo_null_move()
+        if king_capturable:
+            raise ValueError("FEN has the side not to move in check: %r" % fen)
+
+    """
+    The current position as a FEN string
+    """
+
+    def get_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "E":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += PIECE_LETTERS[piece]
+            ranks.append(rank + (str(empty) if empty else ""))
+        rights = self.current_castle_rights
+        castling = ("K" if rights.white_short else "") + ("Q" if rights.white_long else "") + \
+            ("k" if rights.black_short else "") + ("q" if rights.black_long else "")
+        enpassant = "-"
+        if self.enpassant_possible != ():
+            enpassant = "abcdefgh"[self.enpassant_possible[1]] + str(8 - self.enpassant_possible[0])
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.white_turn else "b", castling or "-", enpassant,
+                                      self.halfmove_clock, self.fullmove_number)
+
+    """
+    Replaces the whole position and clears the move history. Everything worked out from the board (bitboards, king
+    squares, zobrist key, score) is rebuilt here, so load_fen and restore both come through this
+    """
+
+    def set_position(self, board, white_turn, rights, enpassant, halfmove_clock, fullmove_number, key_and_score=None,
+                     key_history=()):
         # the board is a 2d array
         # the first letter of pieces is colour and second is piece type
         # E means empty
-        self.board = [
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
-            ["E", "E", "E", "E", "E", "E", "E", "E"],
-            ["E", "E", "E", "E", "E", "E", "E", "E"],
-            ["E", "E", "E", "E", "E", "E", "E", "E"],
-            ["E", "E", "E", "E", "E", "E", "E", "E"],
-            ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
-        ]
-        self.move_log = []
-        self.white_turn = True
-        self.white_king_location = (7, 4)  # need to keep track of kings location for pins and checks
-        self.black_king_location = (0, 4)
+        self.board = board
+        self.undo_stack = [0] * UNDO_STACK_SIZE  # one record per move made (layout at the top of the file)
+        self.moves_made = 0  # records in use, the rest are spare so making a move doesn't grow the list
+        self.stats = None  # a ChessStats.search_stats while an instrumented search runs, counting the work done here
+        self.move_index = None  # get_move_index's index and the (key, moves made) of the position it is for
+        self.move_index_position = None
+        self.white_turn = white_turn
         self.check_mate = False
         self.stale_mate = False
-        self.enpassant_possible = ()  # coordinates for the square where en passant capture is possible
-        self.current_castle_rights = castle_rights(True, True, True, True)
-        self.castle_rights_log = [castle_rights(self.current_castle_rights.white_short,
-                                                self.current_castle_rights.white_long,
-                                                self.current_castle_rights.black_short,
-                                                self.current_castle_rights.black_long)]
-        # creates a copy of the current castle rights so when we append more for the log it will be the current one at that time
+        self.enpassant_possible = enpassant  # coordinates for the square where en passant capture is possible
+        self.current_castle_rights = rights
+        self.halfmove_clock = halfmove_clock  # moves since the last capture or pawn move, for the fifty-move rule
+        self.fullmove_number = fullmove_number  # starts at 1 and goes up after each black move
+        # keys of positions before this one that have no undo record (see snapshot), and how often each key before the
+        # current position has come up, so a repeated position is one dict lookup however long the game
+        self.earlier_keys = tuple(key_history)
+        self.key_counts = {}
+        for key in self.earlier_keys:
+            self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        # one 64-bit int per piece plus one per colour, kept in step with board by set_square
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.colour_bitboards = {'w': 0, 'b': 0}
+        for row in range(8):
+            for file in range(8):
+                piece = board[row][file]
+                if piece != "E":
+                    self.bitboards[piece] |= SQUARE_BITS[row * 8 + file]
+                    self.colour_bitboards[piece[0]] |= SQUARE_BITS[row * 8 + file]
+                    if piece == "wK":  # need to keep track of kings location for pins and checks
+                        self.white_king_location = (row, file)
+                    elif piece == "bK":
+                        self.black_king_location = (row, file)
+        if key_and_score is None:
+            self.zobrist_key = ChessZobrist.compute_key(self)  # 64-bit position identity, updated as moves are made and undone
+            self.material_score, self.position_score = ChessEval.evaluate_board(board)  # centipawns, white minus black
+        else:
+            self.zobrist_key, self.material_score, self.position_score = key_and_score
+
+    """
+    The position without its move history as a small tuple of ints and bytes, cheap to pickle for another process:
+    (64 square codes, white to move, castle mask, en passant square or -1, halfmove clock, fullmove number, zobrist
+    key, material score, position score, keys since the last capture or pawn move). The keys are all that's kept of
+    the history, they are the only earlier positions that can come round again
+    """
+
+    def snapshot(self):
+        squares = bytes(SQUARE_CODES[piece] for row in self.board for piece in row)
+        enpassant = self.enpassant_possible[0] * 8 + self.enpassant_possible[1] if self.enpassant_possible != () else -1
+        history = self.get_key_history()
+        recent_keys = tuple(history[-self.halfmove_clock:]) if self.halfmove_clock else ()
+        return (squares, self.white_turn, self.current_castle_rights.get_mask(), enpassant, self.halfmove_clock,
+                self.fullmove_number, self.zobrist_key, self.material_score, self.position_score, recent_keys)
+
+    """
+    Sets up the position from a snapshot, which keeps its key and score so they don't have to be worked out again
+    """
+
+    def restore(self, snapshot):
+        squares, white_turn, mask, enpassant, halfmove_clock, fullmove_number, key, material, position, recent_keys = snapshot
+        board = [[SQUARE_PIECES[code] for code in squares[row * 8:row * 8 + 8]] for row in range(8)]
+        rights = castle_rights(bool(mask & 1), bool(mask & 2), bool(mask & 4), bool(mask & 8))
+        self.set_position(board, white_turn, rights, COORDINATES[enpassant] if enpassant >= 0 else (), halfmove_clock,
+                          fullmove_number, (key, material, position), recent_keys)
+
+    """
+    A new game_state in the same position, without the move history but still knowing which positions would repeat
+    """
+
+    def clone(self):
+        new_state = game_state.__new__(game_state)
+        new_state.use_bitboards = self.use_bitboards
+        new_state.restore(self.snapshot())
+        return new_state
+
+    """
+    The packed moves made since the position was set up, oldest first
+    """
 
+    @property
+    def move_log(self):
+        return [record & MOVE_MASK for record in self.undo_stack[:self.moves_made]]
+
+    """
+    The zobrist key of every earlier position known, oldest first
+    """
+
+    def get_key_history(self):
+        return list(self.earlier_keys) + [record >> UNDO_KEY_SHIFT for record in self.undo_stack[:self.moves_made]]
+
+    """
+    Puts piece (or "E") on a square, keeping the bitboards, zobrist key and score in step with the board
+    """
+
+    def set_square(self, row, file, piece):
+        old_piece = self.board[row][file]
+        self.board[row][file] = piece
+        sq = row * 8 + file
+        bit = SQUARE_BITS[sq]
+        if old_piece != "E":
+            self.bitboards[old_piece] ^= bit
+            self.colour_bitboards[old_piece[0]] ^= bit
+            self.zobrist_key ^= ChessZobrist.PIECE_KEYS[old_piece][sq]
+            self.material_score -= ChessEval.MATERIAL[old_piece]
+            self.position_score -= ChessEval.POSITION[old_piece][sq]
+        if piece != "E":
+            self.bitboards[piece] |= bit
+            self.colour_bitboards[piece[0]] |= bit
+            self.zobrist_key ^= ChessZobrist.PIECE_KEYS[piece][sq]
+            self.material_score += ChessEval.MATERIAL[piece]
+            self.position_score += ChessEval.POSITION[piece][sq]
+
+    """
+    The part of the zobrist key that isn't pieces: castle rights and the en passant file
+    """
+
+    def rights_key(self):
+        key = ChessZobrist.CASTLE_KEYS[self.current_castle_rights.get_mask()]
+        if self.enpassant_possible != ():
+            key ^= ChessZobrist.ENPASSANT_KEYS[self.enpassant_possible[1]]
+        return key
 
     """
     Takes a move as a parameter and executes it
     """
 
     def make_move(self, move):
-        self.board[move.initial_row][move.first_file] = "E"
-        self.board[move.last_row][move.last_file] = move.piece_moved
-        self.move_log.append(move)  # log the move
+        self.make_packed_move(move.packed)
+
+    """
+    Executes a packed move (see the layout at the top of the file). This is what the search calls
+    """
+
+    def make_packed_move(self, packed):
+        first_sq = packed & 63
+        last_sq = (packed >> 6) & 63
+        flag = (packed >> 12) & 3
+        promotion = (packed >> 14) & 7
+        piece_moved = PIECES[(packed >> 17) & 15]
+        initial_row, first_file = COORDINATES[first_sq]
+        last_row, last_file = COORDINATES[last_sq]
+        key = self.zobrist_key
+        enpassant = self.enpassant_possible[1] + 1 if self.enpassant_possible != () else 0
+        if self.moves_made == len(self.undo_stack):
+            self.undo_stack.extend([0] * len(self.undo_stack))
+        self.undo_stack[self.moves_made] = packed | self.current_castle_rights.get_mask() << UNDO_RIGHTS_SHIFT | \
+            enpassant << UNDO_ENPASSANT_SHIFT | (self.halfmove_clock & 0xFFFF) << UNDO_CLOCK_SHIFT | key << UNDO_KEY_SHIFT
+        self.moves_made += 1
+        self.key_counts[key] = self.key_counts.get(key, 0) + 1
+        self.zobrist_key ^= self.rights_key()  # take out the old rights, the new ones are put in at the end
+        if piece_moved[1] == 'p' or packed >> 21:  # pawn moves and captures can't be undone so the count starts again
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if piece_moved[0] == 'b':
+            self.fullmove_number += 1
+        self.set_square(initial_row, first_file, "E")
+        if promotion:  # pawn promotion
+            self.set_square(last_row, last_file, piece_moved[0] + PROMOTION_TYPES[promotion])
+        else:
+            self.set_square(last_row, last_file, piece_moved)
         self.white_turn = not self.white_turn  # swap players
         # update king's position
-        if move.piece_moved == "wK":
-            self.white_king_location = (move.last_row, move.last_file)
-        elif move.piece_moved == "bK":
-            self.black_king_location = (move.last_row, move.last_file)
-
-        # pawn promotion
-        if move.pawn_promotion_valid:
-            if not self.white_turn:
-                self.board[move.last_row][move.last_file] = "wQ"
-            else:
-                self.board[move.last_row][move.last_file] = "bQ"
+        if piece_moved == "wK":
+            self.white_king_location = (last_row, last_file)
+        elif piece_moved == "bK":
+            self.black_king_location = (last_row, last_file)
 
         # castle move
-        if move.is_castle_move:
-            if move.last_file - move.first_file == 2:  # short castle
-                self.board[move.last_row][move.last_file - 1] = self.board[move.last_row][
-                    move.last_file + 1]  # moves the rook
-                self.board[move.last_row][move.last_file + 1] = 'E'  # delete old rook
+        if flag == CASTLE_FLAG:
+            if last_file - first_file == 2:  # short castle
+                self.set_square(last_row, last_file - 1, self.board[last_row][last_file + 1])  # moves the rook
+                self.set_square(last_row, last_file + 1, 'E')  # delete old rook
             else:  # long castle
-                self.board[move.last_row][move.last_file + 1] = self.board[move.last_row][
-                    move.last_file - 2]  # moves the rook
-                self.board[move.last_row][move.last_file - 2] = 'E'  # delete old rook
+                self.set_square(last_row, last_file + 1, self.board[last_row][last_file - 2])  # moves the rook
+                self.set_square(last_row, last_file - 2, 'E')  # delete old rook
 
         # update castling rights
-        self.update_castling_rights(move)
-        self.castle_rights_log.append(castle_rights(self.current_castle_rights.white_short,
-                                                    self.current_castle_rights.white_long,
-                                                    self.current_castle_rights.black_short,
-                                                    self.current_castle_rights.black_long))
+        captured = (packed >> 21) & 15
+        self.update_castling_rights(piece_moved, first_sq, PIECES[captured - 1] if captured else "E", last_sq)
 
         # en passant
-        if move.is_enpasssant_move:
-            self.board[move.initial_row][move.last_file] = 'E'  # capturing the pawn when enpassant
+        if flag == ENPASSANT_FLAG:
+            self.set_square(initial_row, last_file, 'E')  # capturing the pawn when enpassant
 
         # update enpassant_possible
-        if move.piece_moved[1] == 'p' and abs(move.initial_row - move.last_row) == 2:  # only on 2 square pawn advances
-            self.enpassant_possible = ((move.initial_row + move.last_row)//2, move.first_file)  # double divide gives an integer rather than single divide gives decimal
+        if flag == DOUBLE_PUSH_FLAG:  # only on 2 square pawn advances
+            self.enpassant_possible = ((initial_row + last_row)//2, first_file)  # double divide gives an integer rather than single divide gives decimal
         else:
             self.enpassant_possible = ()
-
-
+        self.zobrist_key ^= self.rights_key() ^ ChessZobrist.WHITE_TO_MOVE_KEY
 
     """
-    Update the castling rights with move parameter
+    Update the castling rights after piece_moved goes from first_sq to last_sq, capturing piece_captured
     """
 
-    def update_castling_rights(self, move):
-        if move.piece_moved == 'wK':  # if kings have moved then castling cant be done
+    def update_castling_rights(self, piece_moved, first_sq, piece_captured, last_sq):
+        if piece_moved == 'wK':  # if kings have moved then castling cant be done
             self.current_castle_rights.white_short = False
             self.current_castle_rights.white_long = False
-        elif move.piece_moved == 'bK':
+        elif piece_moved == 'bK':
             self.current_castle_rights.black_short = False
             self.current_castle_rights.black_long = False
-        elif move.piece_moved == 'wR':
-            if move.initial_row == 7:
-                if move.first_file == 7:  # right rook
-                    self.current_castle_rights.black_short = False
-                elif move.first_file == 0:  # left
-                    self.current_castle_rights.black_long = False
-        elif move.piece_moved == 'bR':
-            if move.initial_row == 0:
-                if move.first_file == 7:  # right rook
-                    self.current_castle_rights.black_short = False
-                elif move.first_file == 0:  # left
-                    self.current_castle_rights.black_long = False
+        elif piece_moved == 'wR':
+            if first_sq == 63:  # right rook
+                self.current_castle_rights.white_short = False
+            elif first_sq == 56:  # left
+                self.current_castle_rights.white_long = False
+        elif piece_moved == 'bR':
+            if first_sq == 7:  # right rook
+                self.current_castle_rights.black_short = False
+            elif first_sq == 0:  # left
+                self.current_castle_rights.black_long = False
 
         # no castling if there is no rook
-        if move.piece_captured == 'wR':
-            if move.last_row == 7:
-                if move.last_file == 0:
-                    self.current_castle_rights.white_long = False
-                if move.last_file == 7:
-                    self.current_castle_rights.white_short = False
-        if move.piece_captured == 'bR':
-            if move.last_row == 0:
-                if move.last_file == 0:
-                    self.current_castle_rights.black_long = False
-                if move.last_file == 7:
-                    self.current_castle_rights.black_short = False
-
+        if piece_captured == 'wR':
+            if last_sq == 56:
+                self.current_castle_rights.white_long = False
+            elif last_sq == 63:
+                self.current_castle_rights.white_short = False
+        elif piece_captured == 'bR':
+            if last_sq == 0:
+                self.current_castle_rights.black_long = False
+            elif last_sq == 7:
+                self.current_castle_rights.black_short = False
 
     """
-    Undo the last move
+    Undo the last move, putting the rights, en passant square, clock and key back from its undo record
     """
 
     def undo_move(self):
-        if len(self.move_log) != 0:  # make sure there is a move to undo
-            move_object = self.move_log.pop()
-            self.board[move_object.initial_row][move_object.first_file] = move_object.piece_moved
-            self.board[move_object.last_row][move_object.last_file] = move_object.piece_captured
+        if self.moves_made != 0:  # make sure there is a move to undo
+            self.moves_made -= 1
+            record = self.undo_stack[self.moves_made]
+            packed = record & MOVE_MASK
+            first_sq = packed & 63
+            last_sq = (packed >> 6) & 63
+            flag = (packed >> 12) & 3
+            piece_moved = PIECES[(packed >> 17) & 15]
+            captured = (packed >> 21) & 15
+            piece_captured = PIECES[captured - 1] if captured else "E"
+            initial_row, first_file = COORDINATES[first_sq]
+            last_row, last_file = COORDINATES[last_sq]
+            self.set_square(initial_row, first_file, piece_moved)
             self.white_turn = not self.white_turn  # switching turns back
             # update king's position
-            if move_object.piece_moved == "wK":
-                self.white_king_location = (move_object.initial_row, move_object.first_file)
-            elif move_object.piece_moved == "bK":
-                self.black_king_location = (move_object.initial_row, move_object.first_file)
-
-            # undo enpassant move
-            if move_object.is_enpasssant_move:
-                self.board[move_object.last_row][move_object.last_file] = "E"  # leave the destination square blank
-                self.board[move_object.initial_row][move_object.last_file] = move_object.piece_captured  # putting enemy piece back
-                self.enpassant_possible = (move_object.last_row, move_object.last_file)  # crucial piece to allow redoing en passant
-
-            # undo a 2 square pawn advance
-            if move_object.piece_moved[1] == 'p' and abs(move_object.initial_row - move_object.last_row) == 2:
-                self.enpassant_possible = ()
-
-            # undo castle rights
-            self.castle_rights_log.pop()  # delete new castle rights from undoing move
-            castle_rights = self.castle_rights_log[-1]  # set the current castle rights to the last one in the list
-            self.current_castle_rights.white_short = castle_rights.white_short
-            self.current_castle_rights.white_long = castle_rights.white_long
-            self.current_castle_rights.black_short = castle_rights.black_short
-            self.current_castle_rights.black_long = castle_rights.black_long
+            if piece_moved == "wK":
+                self.white_king_location = (initial_row, first_file)
+            elif piece_moved == "bK":
+                self.black_king_location = (initial_row, first_file)
+
+            if flag == ENPASSANT_FLAG:  # undo enpassant move
+                self.set_square(last_row, last_file, "E")  # leave the destination square blank
+                self.set_square(initial_row, last_file, piece_captured)  # putting enemy piece back
+            else:
+                self.set_square(last_row, last_file, piece_captured)
+
+            # put back whatever en passant square there was before the move (not just the one an en passant capture
+            # used), it is always on the far side from the player who moved
+            enpassant = (record >> UNDO_ENPASSANT_SHIFT) & 15
+            self.enpassant_possible = ((2 if self.white_turn else 5), enpassant - 1) if enpassant else ()
+            self.halfmove_clock = (record >> UNDO_CLOCK_SHIFT) & 0xFFFF
+            if piece_moved[0] == 'b':
+                self.fullmove_number -= 1
+            self.current_castle_rights.set_mask((record >> UNDO_RIGHTS_SHIFT) & 15)
 
             # undo castle
-            if move_object.is_castle_move:
-                if move_object.last_file - move_object.first_file == 2:  # short castle
-                    self.board[move_object.last_row][move_object.last_file+1] = self.board[move_object.last_row][move_object.last_file-1]
-                    self.board[move_object.last_row][move_object.last_file-1] = 'E'
+            if flag == CASTLE_FLAG:
+                if last_file - first_file == 2:  # short castle
+                    self.set_square(last_row, last_file+1, self.board[last_row][last_file-1])
+                    self.set_square(last_row, last_file-1, 'E')
                 else:
-                    print(move_object.last_file)
-                    self.board[move_object.last_row][move_object.last_file-2] = self.board[move_object.last_row][move_object.last_file+1]
-                    self.board[move_object.last_row][move_object.last_file+1] = 'E'
+                    self.set_square(last_row, last_file-2, self.board[last_row][last_file+1])
+                    self.set_square(last_row, last_file+1, 'E')
+            key = record >> UNDO_KEY_SHIFT
+            self.zobrist_key = key
+            if self.key_counts[key] == 1:
+                del self.key_counts[key]
+            else:
+                self.key_counts[key] -= 1
+
+    """
+    Passes the turn without moving, for null-move pruning in the search. Only the side to move and the en passant
+    square change, and undo_null_move puts them back. The position isn't counted for repetitions, it can't happen in a
+    game
+    """
+
+    def make_null_move(self):
+        enpassant = self.enpassant_possible[1] + 1 if self.enpassant_possible != () else 0
+        if self.moves_made == len(self.undo_stack):
+            self.undo_stack.extend([0] * len(self.undo_stack))
+        self.undo_stack[self.moves_made] = NULL_MOVE | self.current_castle_rights.get_mask() << UNDO_RIGHTS_SHIFT | \
+            enpassant << UNDO_ENPASSANT_SHIFT | (self.halfmove_clock & 0xFFFF) << UNDO_CLOCK_SHIFT | \
+            self.zobrist_key << UNDO_KEY_SHIFT
+        self.moves_made += 1
+        if enpassant:
+            self.zobrist_key ^= ChessZobrist.ENPASSANT_KEYS[enpassant - 1]
+            self.enpassant_possible = ()
+        self.zobrist_key ^= ChessZobrist.WHITE_TO_MOVE_KEY
+        self.white_turn = not self.white_turn
+
+    def undo_null_move(self):
+        self.moves_made -= 1
+        record = self.undo_stack[self.moves_made]
+        self.white_turn = not self.white_turn
+        enpassant = (record >> UNDO_ENPASSANT_SHIFT) & 15
+        self.enpassant_possible = ((2 if self.white_turn else 5), enpassant - 1) if enpassant else ()
+        self.zobrist_key = record >> UNDO_KEY_SHIFT
+
+    """
+    How many times the position has come up before in the game. Keys from before the last capture or pawn move are
+    counted too, but they can't match: those moves can't be taken back, so no later position is the same
+    """
+
+    def repetition_count(self):
+        return self.key_counts.get(self.zobrist_key, 0)
+
+    """
+    "threefold repetition" or "fifty-move rule" when either draw applies, otherwise None. Checkmate on the last move
+    of the fifty still wins, so look at check_mate first
+    """
+
+    def draw_reason(self):
+        if self.repetition_count() >= 2:
+            return "threefold repetition"
+        if self.halfmove_clock >= 100:
+            return "fifty-move rule"
+        return None
+
+    """
+    The legal moves as a move_index, built once per position: asking again before a move is made or undone gives the
+    same index back without generating anything
+    """
+
+    def get_move_index(self):
+        position = (self.zobrist_key, self.moves_made)
+        if self.move_index_position != position:
+            self.move_index = move_index(self.get_valid_moves())
+            self.move_index_position = position
+        return self.move_index
 
     """
     All moves considering checks
     """
 
     def get_valid_moves(self):
-        temp_enpassant_possible = self.enpassant_possible
-        temp_castle_rights = castle_rights(self.current_castle_rights.white_short,
-            self.current_castle_rights.white_long,
-            self.current_castle_rights.black_short,
-            self.current_castle_rights.black_long)  # copy of current castling rights
+        if self.stats is not None:
+            self.stats.valid_move_calls += 1
+        if self.use_bitboards:
+            return self.get_legal_moves()
         # 1) Generate all possible moves
         moves = self.get_all_possible_moves()
         if self.white_turn:
@@ -204,11 +537,165 @@ class game_state():
         else:  # when undoing moves make sure you still can if it was checkmate next move
             self.check_mate = False
             self.stale_mate = False
+        return moves  # undo_move put the en passant square and castle rights back exactly, nothing to restore here
 
-        self.enpassant_possible = temp_enpassant_possible  # keep enpassant move when undoing
-        self.current_castle_rights = temp_castle_rights
-        return moves
+    """
+    All moves considering checks, without making any of them, as move objects
+    """
+
+    def get_legal_moves(self):
+        return [move.from_packed(packed) for packed in self.get_packed_moves()]
+
+    """
+    Moves as packed ints, generated a whole piece type at a time from the bitboards. With legal, checkers, pinned pieces
+    and the squares that stop a check are worked out once for the position and only legal moves are produced (and
+    check_mate/stale_mate are set); without it every pseudo-legal move is produced except castling, like
+    get_all_possible_moves. captures_only keeps just captures and promotions, for the quiescence search, and leaves
+    check_mate/stale_mate alone since an empty list doesn't mean there are no moves
+    """
 
+    def get_packed_moves(self, legal=True, captures_only=False):
+        if self.stats is not None:
+            start = time.perf_counter()
+        moves = []
+        add = moves.append
+        board = self.board
+        bitboards = self.bitboards
+        squares = ChessBitboard.squares
+        if self.white_turn:
+            colour, enemy = 'w', 'b'
+        else:
+            colour, enemy = 'b', 'w'
+        own = self.colour_bitboards[colour]
+        opponent = self.colour_bitboards[enemy]
+        occupied = own | opponent
+        empty = FULL_BOARD ^ occupied
+        king_bit = bitboards[colour + 'K']
+        king_sq = king_bit.bit_length() - 1
+        enemy_diagonal = bitboards[enemy + 'B'] | bitboards[enemy + 'Q']
+        enemy_straight = bitboards[enemy + 'R'] | bitboards[enemy + 'Q']
+
+        # 1) pieces giving check
+        checkers = ChessBitboard.attackers_to(bitboards, king_sq, enemy, occupied) if legal else 0
+
+        # 2) king moves, looking through the king itself so it can't step back along a slider's line
+        without_king = occupied ^ king_bit
+        moved = MOVED_BITS[colour + 'K'] | king_sq
+        for last_sq in squares(ChessBitboard.KING_ATTACKS[king_sq] & (opponent if captures_only else ~own)):
+            if not legal or not ChessBitboard.is_attacked(bitboards, last_sq, enemy, without_king):
+                add(moved | last_sq << 6 | CAPTURED_BITS[board[last_sq >> 3][last_sq & 7]])
+
+        if checkers & (checkers - 1) == 0:  # a double check can only be answered by the king
+            # 3) squares that deal with a single check: capture the checker or block its line
+            if checkers:
+                checker_sq = checkers.bit_length() - 1
+                check_mask = checkers | ChessBitboard.BETWEEN[king_sq][checker_sq]
+            else:
+                check_mask = FULL_BOARD
+
+            # 4) pinned pieces, each may only move along the line between the king and its pinner
+            pin_rays = {}
+            if legal:
+                snipers = (ChessBitboard.ROOK_RAYS[king_sq] & enemy_straight) | (ChessBitboard.BISHOP_RAYS[king_sq] & enemy_diagonal)
+                for sniper_sq in squares(snipers):
+                    between = ChessBitboard.BETWEEN[king_sq][sniper_sq]
+                    blockers = between & occupied
+                    if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                        pin_rays[blockers.bit_length() - 1] = between | SQUARE_BITS[sniper_sq]
+            pinned = sum(SQUARE_BITS[sq] for sq in pin_rays)
+            quiet_targets = empty & check_mask if not captures_only else 0
+            capture_targets = opponent & check_mask
+
+            # 5) pawns, generated a whole set at a time then checked individually against the masks
+            pawns = bitboards[colour + 'p']
+            if self.white_turn:
+                singles = (pawns >> 8) & empty
+                doubles = ((singles & ROW_MASKS[5]) >> 8) & empty
+                pawn_moves = ((singles, 8, 0), (doubles, 16, DOUBLE_PUSH_FLAG << 12),
+                              (((pawns & NOT_FILE_A) >> 9) & opponent, 9, 0), (((pawns & NOT_FILE_H) >> 7) & opponent, 7, 0))
+                promotion_row = ROW_MASKS[0]
+            else:
+                singles = (pawns << 8) & empty
+                doubles = ((singles & ROW_MASKS[2]) << 8) & empty
+                pawn_moves = ((singles, -8, 0), (doubles, -16, DOUBLE_PUSH_FLAG << 12),
+                              (((pawns & NOT_FILE_H) << 9) & opponent, -9, 0), (((pawns & NOT_FILE_A) << 7) & opponent, -7, 0))
+                promotion_row = ROW_MASKS[7]
+            moved = MOVED_BITS[colour + 'p']
+            for destinations, offset, flag in pawn_moves:
+                if captures_only and offset in (8, 16, -8, -16):
+                    destinations &= promotion_row  # a push only counts if it promotes
+                for last_sq in squares(destinations & check_mask):
+                    first_sq = last_sq + offset
+                    if SQUARE_BITS[first_sq] & pinned and not SQUARE_BITS[last_sq] & pin_rays[first_sq]:
+                        continue
+                    packed = moved | first_sq | last_sq << 6 | flag | CAPTURED_BITS[board[last_sq >> 3][last_sq & 7]]
+                    if SQUARE_BITS[last_sq] & promotion_row:
+                        for promotion in PROMOTION_BITS:
+                            add(packed | promotion)
+                    else:
+                        add(packed)
+            if self.enpassant_possible != ():
+                enpassant_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+                captured_sq = enpassant_sq + (8 if self.white_turn else -8)
+                for first_sq in squares(ChessBitboard.PAWN_ATTACKS[enemy][enpassant_sq] & pawns):
+                    if legal:
+                        # two pawns leave the same row at once, so rather than trusting the pin masks, take the capture
+                        # off the occupancy and see if any slider can see the king afterwards
+                        after = (occupied ^ SQUARE_BITS[first_sq] ^ SQUARE_BITS[captured_sq]) | SQUARE_BITS[enpassant_sq]
+                        if checkers & ~SQUARE_BITS[captured_sq] & ~(enemy_diagonal | enemy_straight):
+                            continue  # a knight or the other pawn still gives check
+                        if ChessBitboard.bishop_attacks(king_sq, after) & enemy_diagonal or \
+                                ChessBitboard.rook_attacks(king_sq, after) & enemy_straight:
+                            continue
+                    add(moved | first_sq | enpassant_sq << 6 | ENPASSANT_FLAG << 12 | CAPTURED_BITS[enemy + 'p'])
+
+            # 6) pieces, pinned knights can never move. Quiet moves and captures are split so only captures look at the board
+            for piece_type, attacks in (('N', None), ('B', ChessBitboard.bishop_attacks), ('R', ChessBitboard.rook_attacks),
+                                        ('Q', ChessBitboard.queen_attacks)):
+                moved = MOVED_BITS[colour + piece_type]
+                for first_sq in squares(bitboards[colour + piece_type]):
+                    if attacks is None:
+                        if SQUARE_BITS[first_sq] & pinned:
+                            continue
+                        destinations = ChessBitboard.KNIGHT_ATTACKS[first_sq]
+                    else:
+                        destinations = attacks(first_sq, occupied)
+                        if SQUARE_BITS[first_sq] & pinned:
+                            destinations &= pin_rays[first_sq]
+                    packed = moved | first_sq
+                    for last_sq in squares(destinations & capture_targets):
+                        add(packed | last_sq << 6 | CAPTURED_BITS[board[last_sq >> 3][last_sq & 7]])
+                    for last_sq in squares(destinations & quiet_targets):
+                        add(packed | last_sq << 6)
+
+            # 7) castling, never out of check, through a piece or through an attacked square
+            if legal and not checkers and not captures_only:
+                moved = MOVED_BITS[colour + 'K'] | king_sq | CASTLE_FLAG << 12
+                if (self.white_turn and self.current_castle_rights.white_short) or (not self.white_turn and self.current_castle_rights.black_short):
+                    if not occupied & (SQUARE_BITS[king_sq + 1] | SQUARE_BITS[king_sq + 2]) and \
+                            not ChessBitboard.is_attacked(bitboards, king_sq + 1, enemy, occupied) and \
+                            not ChessBitboard.is_attacked(bitboards, king_sq + 2, enemy, occupied):
+                        add(moved | (king_sq + 2) << 6)
+                if (self.white_turn and self.current_castle_rights.white_long) or (not self.white_turn and self.current_castle_rights.black_long):
+                    if not occupied & (SQUARE_BITS[king_sq - 1] | SQUARE_BITS[king_sq - 2] | SQUARE_BITS[king_sq - 3]) and \
+                            not ChessBitboard.is_attacked(bitboards, king_sq - 1, enemy, occupied) and \
+                            not ChessBitboard.is_attacked(bitboards, king_sq - 2, enemy, occupied):
+                        add(moved | (king_sq - 2) << 6)
+
+        if legal and not captures_only:
+            if len(moves) == 0:  # either checkmate or stalemate
+                if checkers:
+                    self.check_mate = True
+                else:
+                    self.stale_mate = True
+            else:  # when undoing moves make sure you still can if it was checkmate next move
+                self.check_mate = False
+                self.stale_mate = False
+        if self.stats is not None:
+            self.stats.move_generations += 1
+            self.stats.moves_generated += len(moves)
+            self.stats.add_time("move_generation", time.perf_counter() - start)
+        return moves
     """
     checks whichever players kings in check
     """
@@ -224,13 +711,60 @@ class game_state():
     """
 
     def square_under_attack(self, row, file):
-        self.white_turn = not self.white_turn  # switch to opponent's turn
-        opp_moves = self.get_all_possible_moves()
-        self.white_turn = not self.white_turn  # switch turns back
-        for move in opp_moves:
-            if move.last_row == row and move.last_file == file:  # square is under attack
-                return True
-        return False
+        if self.stats is not None:
+            self.stats.attack_checks += 1
+        enemy = 'b' if self.white_turn else 'w'
+        if self.use_bitboards:
+            occupied = self.colour_bitboards['w'] | self.colour_bitboards['b']
+            return ChessBitboard.is_attacked(self.bitboards, row * 8 + file, enemy, occupied)
+        return len(self.scan_attackers(row, file, enemy, True)) != 0
+
+    """
+    Squares (row, file) of every piece of colour attacking the square r, c. Colour defaults to the enemy of the player
+    to move, the same side square_under_attack looks at
+    """
+
+    def get_attackers(self, row, file, colour=None):
+        if colour is None:
+            colour = 'b' if self.white_turn else 'w'
+        if self.use_bitboards:
+            occupied = self.colour_bitboards['w'] | self.colour_bitboards['b']
+            attackers = ChessBitboard.attackers_to(self.bitboards, row * 8 + file, colour, occupied)
+            return [COORDINATES[sq] for sq in ChessBitboard.squares(attackers)]
+        return self.scan_attackers(row, file, colour, False)
+
+    """
+    Looks outwards from the square r, c on the board for pieces of colour that attack it: knight jumps, pawn and king
+    steps, then each rook and bishop line up to the first piece. Stops after the first attacker if first_only
+    """
+
+    def scan_attackers(self, row, file, colour, first_only):
+        attackers = []
+        pawn_row = row + 1 if colour == 'w' else row - 1  # white pawns attack upwards so they sit on the row below
+        for piece_type, steps in (('N', ChessBitboard.KNIGHT_JUMPS), ('K', ChessBitboard.KING_STEPS),
+                                  ('p', ((pawn_row - row, -1), (pawn_row - row, 1)))):
+            for step in steps:
+                last_row = row + step[0]
+                last_file = file + step[1]
+                if 0 <= last_row < 8 and 0 <= last_file < 8 and self.board[last_row][last_file] == colour + piece_type:
+                    attackers.append((last_row, last_file))
+                    if first_only:
+                        return attackers
+        for sliders, directions in (('RQ', ChessBitboard.ROOK_DIRECTIONS), ('BQ', ChessBitboard.BISHOP_DIRECTIONS)):
+            for direction in directions:
+                last_row = row + direction[0]
+                last_file = file + direction[1]
+                while 0 <= last_row < 8 and 0 <= last_file < 8:
+                    piece = self.board[last_row][last_file]
+                    if piece != "E":  # first piece along the line either attacks the square or blocks the rest
+                        if piece[0] == colour and piece[1] in sliders:
+                            attackers.append((last_row, last_file))
+                            if first_only:
+                                return attackers
+                        break
+                    last_row += direction[0]
+                    last_file += direction[1]
+        return attackers
 
 
     """
@@ -238,6 +772,8 @@ class game_state():
     """
 
     def get_all_possible_moves(self):
+        if self.use_bitboards:
+            return self.get_bitboard_moves()
         moves = []
         for row in range(len(self.board)):  # number of rows
             for file in range(len(self.board[row])):  # number of files in given row
@@ -260,11 +796,20 @@ class game_state():
         return moves
 
 
+    """
+    All moves without considering checks, generated from the bitboards. Produces the same moves as scanning the board
+    does
+    """
+
+    def get_bitboard_moves(self):
+        return [move.from_packed(packed) for packed in self.get_packed_moves(legal=False)]
+
     """
     Get all the pawn moves for the pawn located at row, col and add these moves to the list
     """
 
     def get_pawn_moves(self, row, file, moves):
+        first_new_move = len(moves)
         if self.white_turn == True:  # white to move
             if self.board[row - 1][file] == "E":  # 1 square pawn advance
                 moves.append(move((row, file), (row - 1, file), self.board))
@@ -302,9 +847,11 @@ class game_state():
                 elif (row + 1, file - 1) == self.enpassant_possible:  # enpassant
                     moves.append(move((row, file), (row + 1, file - 1), self.board, enpassant_valid=True))
 
-
-
-        # pawn promotions later
+        # pawn promotions, every move made above that promotes also gets a version for each other piece
+        for i in range(first_new_move, len(moves)):
+            if moves[i].pawn_promotion_valid:
+                for promotion_piece in ('R', 'B', 'N'):
+                    moves.append(move((row, file), (moves[i].last_row, moves[i].last_file), self.board, promotion_piece=promotion_piece))
 
     """
     Get all the rook moves for the rook located at row, col and add these moves to the list
@@ -417,6 +964,33 @@ class game_state():
                 if not self.square_under_attack(row, file - 1) and not self.square_under_attack(row, file - 2):  # make sure the squares arent under check
                     moves.append(move((row, file), (row, file - 2), self.board, castle_valid=True))
 
+"""
+Legal moves looked up by the square they start from and by move_ID, for the UI: the targets of a selected piece and the
+legal move matching a click are dict lookups rather than scans of the move list
+"""
+
+
+class move_index():
+    def __init__(self, valid_moves):
+        self.moves = valid_moves
+        self.by_square = {}  # (row, file) to the moves starting there
+        self.by_id = {}
+        for valid_move in valid_moves:
+            self.by_square.setdefault((valid_move.initial_row, valid_move.first_file), []).append(valid_move)
+            self.by_id[valid_move.move_ID] = valid_move
+
+    def moves_from(self, row, file):
+        return self.by_square.get((row, file), [])
+
+    """
+    The legal move equal to candidate (same move_ID), or None. A click makes a move that promotes to a queen, which
+    matches the queen promotion
+    """
+
+    def find(self, candidate):
+        return self.by_id.get(candidate.move_ID)
+
+
 class castle_rights():
     def __init__(self, white_short, white_long, black_short, black_long):
         self.white_short = white_short
@@ -424,10 +998,25 @@ class castle_rights():
         self.black_short = black_short
         self.black_long = black_long
 
+    """
+    Castle rights packed into 4 bits, white short being the lowest
+    """
+
+    def get_mask(self):
+        return self.white_short | self.white_long << 1 | self.black_short << 2 | self.black_long << 3
+
+    def set_mask(self, mask):
+        self.white_short = bool(mask & 1)
+        self.white_long = bool(mask & 2)
+        self.black_short = bool(mask & 4)
+        self.black_long = bool(mask & 8)
+
 
 class move():
+    __slots__ = ("initial_row", "first_file", "last_row", "last_file", "piece_moved", "piece_captured",
+                 "pawn_promotion_valid", "promotion_piece", "is_enpasssant_move", "is_castle_move", "move_ID", "packed")
 
-    def __init__(self, first_sqr, last_sqr, board, enpassant_valid=False, castle_valid=False): # enpassant possible is an optional parameter used in some cases
+    def __init__(self, first_sqr, last_sqr, board, enpassant_valid=False, castle_valid=False, promotion_piece='Q'): # enpassant possible is an optional parameter used in some cases
         # enpassant possible is false so it won't work unless in the function call it is specified which makes it optional and quite useful
         self.initial_row = int(first_sqr[0])
         self.first_file = int(first_sqr[1])
@@ -437,8 +1026,10 @@ class move():
         self.piece_captured = board[self.last_row][self.last_file]
         # pawn promotion
         self.pawn_promotion_valid = False
+        self.promotion_piece = None
         if (self.piece_moved == 'wp' and self.last_row == 0) or (self.piece_moved == 'bp' and self.last_row == 7):  # Flags up when pawn promotion is available
             self.pawn_promotion_valid = True
+            self.promotion_piece = promotion_piece  # queen unless asked for something else
         # en passant
         self.is_enpasssant_move = enpassant_valid
         if self.is_enpasssant_move:
@@ -448,7 +1039,47 @@ class move():
                     self.piece_captured = 'bp'
         # castle
         self.is_castle_move = castle_valid
-        self.move_ID = self.initial_row*1000 + self.first_file *100 + self.last_row *10 + self.last_file  # essentially a hash function for each move between 0000 and 7777 needed for equals function so can decipher between pieces
+        self.move_ID = self.initial_row*1000 + self.first_file *100 + self.last_row *10 + self.last_file + PROMOTION_ID_OFFSETS[self.promotion_piece]  # essentially a hash function for each move between 0000 and 7777 needed for equals function so can decipher between pieces
+        self.packed = self.pack()
+
+    """
+    Builds a move from its packed int without looking at a board, used where moves leave the generator or search
+    """
+
+    @staticmethod
+    def from_packed(packed):
+        new_move = move.__new__(move)
+        new_move.initial_row, new_move.first_file = COORDINATES[packed & 63]
+        new_move.last_row, new_move.last_file = COORDINATES[(packed >> 6) & 63]
+        new_move.piece_moved = PIECES[(packed >> 17) & 15]
+        captured = (packed >> 21) & 15
+        new_move.piece_captured = PIECES[captured - 1] if captured else "E"
+        new_move.promotion_piece = PROMOTION_TYPES[(packed >> 14) & 7]
+        new_move.pawn_promotion_valid = new_move.promotion_piece is not None
+        flag = (packed >> 12) & 3
+        new_move.is_enpasssant_move = flag == ENPASSANT_FLAG
+        new_move.is_castle_move = flag == CASTLE_FLAG
+        new_move.move_ID = new_move.initial_row*1000 + new_move.first_file*100 + new_move.last_row*10 + new_move.last_file + \
+            PROMOTION_ID_OFFSETS[new_move.promotion_piece]
+        new_move.packed = packed
+        return new_move
+
+    """
+    The packed int for this move (layout at the top of the file)
+    """
+
+    def pack(self):
+        if self.is_enpasssant_move:
+            flag = ENPASSANT_FLAG
+        elif self.is_castle_move:
+            flag = CASTLE_FLAG
+        elif self.piece_moved[1:] == 'p' and abs(self.initial_row - self.last_row) == 2:
+            flag = DOUBLE_PUSH_FLAG
+        else:
+            flag = NORMAL_FLAG
+        promotion = PROMOTION_TYPES.index(self.promotion_piece)
+        return (self.initial_row * 8 + self.first_file) | (self.last_row * 8 + self.last_file) << 6 | flag << 12 | \
+            promotion << 14 | MOVED_BITS.get(self.piece_moved, 0) | CAPTURED_BITS.get(self.piece_captured, 0)
 
     """
     Overriding the equals function, needed because we have a move class and they arent exactly the same the instance make sures its an object of move and this makes sures no piece can move in the same place by using move ids
@@ -459,9 +1090,15 @@ class move():
             return self.move_ID == other.move_ID
         return False
 
+    def __hash__(self):  # equal moves have the same move_ID so they hash the same
+        return self.move_ID
+
 
     def get_chess_notation(self):  # gets notation from using the get coords function
-        return self.get_coordinates(self.initial_row, self.first_file) + self.get_coordinates(self.last_row, self.last_file)
+        notation = self.get_coordinates(self.initial_row, self.first_file) + self.get_coordinates(self.last_row, self.last_file)
+        if self.pawn_promotion_valid:
+            notation += self.promotion_piece.lower()  # e.g. e7e8q, the same as UCI
+        return notation
 
     def get_coordinates(self, r, f):  # assigns all chess notation to each position
         file = ""
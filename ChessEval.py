@@ -0,0 +1,226 @@
+"""
+Evaluation tables. A position is scored in centipawns from white's point of view as material plus a piece-square bonus
+for where each piece stands. game_state keeps both totals up to date in set_square, so scoring a leaf of the search is
+just reading two numbers; evaluate_board recomputes them from scratch to check that the running totals are right.
+
+With NumPy installed the same scores can be worked out for many boards at once: a board is an int8 array of 64 square
+codes (ChessEngine.SQUARE_CODES) and its score is a lookup of every square in one table followed by a sum. NumPy is
+optional, without it numpy is None and only the scalar functions are used.
+"""
+
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}  # the king can't be traded so it's worth 0
+
+# piece-square tables from white's point of view, laid out like game_state.board (row 0 is the 8th rank)
+PIECE_SQUARE_TABLES = {
+    'p': [0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    'N': [-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50],
+    'B': [-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20],
+    'R': [0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0],
+    'Q': [-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20],
+    'K': [-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+# signed per piece: white adds and black subtracts. Black reads white's table upside down (row 7 - row)
+MATERIAL = {}
+POSITION = {}
+for piece_type, value in PIECE_VALUES.items():
+    MATERIAL['w' + piece_type] = value
+    MATERIAL['b' + piece_type] = -value
+    POSITION['w' + piece_type] = list(PIECE_SQUARE_TABLES[piece_type])
+    POSITION['b' + piece_type] = [-PIECE_SQUARE_TABLES[piece_type][(7 - sq // 8) * 8 + sq % 8] for sq in range(64)]
+
+DEBUG = False  # True makes every leaf evaluation check the running totals against evaluate_board
+square_table = None  # NumPy (13, 64) array of material plus position for each square code on each square, built on first use
+
+
+"""
+Material and piece-square totals of a board worked out square by square, returned as (material, position)
+"""
+
+
+def evaluate_board(board):
+    material = 0
+    position = 0
+    for row in range(8):
+        for file in range(8):
+            piece = board[row][file]
+            if piece != "E":
+                material += MATERIAL[piece]
+                position += POSITION[piece][row * 8 + file]
+    return material, position
+
+
+"""
+Raises an AssertionError if the game_state's running totals have drifted from the board
+"""
+
+
+def check_score(gs):
+    import ChessEngine  # ChessEngine imports this module, so only import it back when it's needed
+    expected = evaluate_board(gs.board)
+    if (gs.material_score, gs.position_score) != expected:
+        moves = [ChessEngine.move.from_packed(packed).get_chess_notation() for packed in gs.move_log]
+        raise AssertionError("incremental score %s does not match board %s after %s" % (
+            (gs.material_score, gs.position_score), expected, moves))
+
+
+def get_square_table():
+    global square_table
+    if square_table is None:
+        import ChessEngine
+        square_table = numpy.zeros((len(ChessEngine.SQUARE_PIECES), 64), dtype=numpy.int32)  # code 0, empty, scores 0
+        for code, piece in enumerate(ChessEngine.SQUARE_PIECES):
+            if piece != "E":
+                square_table[code] = [MATERIAL[piece] + POSITION[piece][sq] for sq in range(64)]
+    return square_table
+
+
+"""
+The board as an int8 array of square codes, a view over the same bytes game_state.snapshot uses
+"""
+
+
+def board_array(board):
+    import ChessEngine
+    return numpy.frombuffer(bytes(ChessEngine.SQUARE_CODES[piece] for row in board for piece in row), dtype=numpy.int8)
+
+
+"""
+Material plus position from white's point of view for one board array (64,) or a batch of them (n, 64), the same
+number as sum(evaluate_board(board))
+"""
+
+
+def evaluate_array(squares):
+    scores = get_square_table()[squares, numpy.arange(64)].sum(axis=-1)
+    return int(scores) if scores.ndim == 0 else scores
+
+
+"""
+Scores from white's point of view of the positions after each packed move, as an array in the same order. The child
+boards are built in one go from the move fields instead of making and undoing each move
+"""
+
+
+def evaluate_batch(game_state, packed_moves):
+    moves = numpy.array(packed_moves, dtype=numpy.int64)
+    rows = numpy.arange(len(moves))
+    boards = numpy.repeat(board_array(game_state.board)[None, :], len(moves), axis=0)
+    from_sq = moves & 63
+    to_sq = (moves >> 6) & 63
+    flag = (moves >> 12) & 3
+    promotion = (moves >> 14) & 7
+    moved = (moves >> 17) & 15  # index in ChessEngine.PIECES, so the square code is one more
+    black = moved >= 6
+    boards[rows, from_sq] = 0
+    # promotion 1 to 4 is knight to queen, the same order as those pieces in PIECES
+    boards[rows, to_sq] = numpy.where(promotion > 0, promotion + black * 6 + 1, moved + 1)
+    enpassant = flag == 1
+    boards[rows[enpassant], (to_sq + numpy.where(black, -8, 8))[enpassant]] = 0
+    castle = flag == 2
+    short = castle & (to_sq > from_sq)
+    long = castle & (to_sq < from_sq)
+    rook = moved - 1  # the rook's code, two places before the king in PIECES
+    boards[rows[short], to_sq[short] + 1] = 0
+    boards[rows[short], to_sq[short] - 1] = rook[short]
+    boards[rows[long], to_sq[long] - 2] = 0
+    boards[rows[long], to_sq[long] + 1] = rook[long]
+    return evaluate_array(boards)
+
+
+"""
+Times scoring the children of game_state one at a time against scoring them in one batch, for each batch size. The
+one at a time scores are timed both ways the engine can work them out: a full evaluate_board of each child, and
+making the move to read the running totals. Moves are reused round-robin when the position has fewer than size
+"""
+
+
+def benchmark_batch(game_state, sizes=(1, 2, 4, 8, 16, 32, 64, 128), repeats=200):
+    legal = game_state.get_packed_moves()
+    results = []
+    for size in sizes:
+        moves = [legal[index % len(legal)] for index in range(size)]
+        start = time.perf_counter()
+        for repeat in range(repeats):
+            for packed in moves:
+                game_state.make_packed_move(packed)
+                sum(evaluate_board(game_state.board))
+                game_state.undo_move()
+        full_scan = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for repeat in range(repeats):
+            for packed in moves:
+                game_state.make_packed_move(packed)
+                game_state.material_score + game_state.position_score
+                game_state.undo_move()
+        incremental = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for repeat in range(repeats):
+            evaluate_batch(game_state, moves)
+        batch = (time.perf_counter() - start) / repeats
+        results.append({"size": size, "full_scan": full_scan, "incremental": incremental, "batch": batch})
+    return results
+
+
+def main():
+    import ChessEngine
+    if numpy is None:
+        raise SystemExit("NumPy isn't installed")
+    game_state = ChessEngine.game_state(fen="r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    print("  size  full scan  make/undo      batch   (microseconds per batch)")
+    for result in benchmark_batch(game_state):
+        print("%6d %10.1f %10.1f %10.1f" % (result["size"], result["full_scan"] * 1e6, result["incremental"] * 1e6,
+                                            result["batch"] * 1e6))
+
+
+if __name__ == "__main__":
+    main()
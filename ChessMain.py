@@ -2,15 +2,23 @@
 This is the main driver file. It will be responsible for handling user input and displaying the current GameState object
 """
 
+import os
+
 import pygame as pygame_module
 
 import ChessAI
+import ChessBook
 import ChessEngine
+import ChessTablebase
 
 pygame_module.init()
 square_width = square_height = 512
 dim = 8  # dimensions of a chessboard are 8x8
 square_size = square_height / dim
+book_path = "book.bin"  # opening book the AI plays from when the file exists, build one with ChessBook.py
+tablebase_directory = "tablebases"  # endgame tables the AI plays from when the folder exists, see ChessTablebase.py
+max_fps = 30  # caps the frame loop so it doesn't take processor time away from the AI thread
+idle_wait = 1000  # milliseconds to sleep waiting for input when nothing is happening on screen
 IMAGES = {}  # images pieces
 
 
@@ -36,16 +44,27 @@ def main():
     pygame_module.init()
     screen = pygame_module.display.set_mode((square_width, square_height))
     screen.fill(pygame_module.Color("white"))
+    clock = pygame_module.time.Clock()
+    renderer = board_renderer(screen)
+    idle = False  # True after a frame that drew nothing with no AI thinking, the next frame waits for input
     game_state = ChessEngine.game_state()
-    valid_moves = game_state.get_valid_moves()
+    move_index = game_state.get_move_index()
     move_made = False  # move made bool
     create_pieces_images()  # only do this once
+    if os.path.exists(book_path):
+        ChessAI.opening_book = ChessBook.opening_book(book_path)
+    if os.path.isdir(tablebase_directory):
+        ChessAI.endgame_tables = ChessTablebase.tablebase(tablebase_directory)
     running = True
     end_game = False  # for when stalemate or checkmate has occurred
     current_square_selected = ()  # no square is selected initially, keep track of the last click of the user (tuple: (row,col))
     mouse_clicks = []  # keep track of player clicks (two tuples: [(6,4), (4,4)]
     player_white = True  # Human = True, AI = False
     player_black = False
+    ai_max_depth = 6  # the AI stops at whichever of these it reaches first
+    ai_time_limit = 3.0  # seconds per move
+    ai_workers = 1  # processes to search with, os.cpu_count() uses every core (see ChessAI.parallel_search)
+    ai_thinking = None  # the ChessAI.ai_worker searching in the background, None when the AI isn't thinking
     while running:
         if game_state.white_turn and player_white:  # check if current player is an ai or a real person using 'and' logic
             is_human_turn = True
@@ -53,17 +72,34 @@ def main():
             is_human_turn = True
         else:
             is_human_turn = False
-        for e in pygame_module.event.get():
+        events = pygame_module.event.get()
+        if idle and not events:
+            events = [pygame_module.event.wait(idle_wait)]  # sleeps until there is something to do
+        for e in events:
             if e.type == pygame_module.QUIT:
                 running = False
+            elif e.type == pygame_module.VIDEOEXPOSE:  # the window was covered up, what we drew may be gone
+                renderer.invalidate()
             elif e.type == pygame_module.KEYDOWN:
+                if e.key in (pygame_module.K_z, pygame_module.K_r) and ai_thinking is not None:
+                    ai_thinking.cancel()  # the position it was searching is about to change
+                    ai_thinking = None
                 if e.key == pygame_module.K_z:  # undo when 'z' is pressed
                     game_state.undo_move()
-                    valid_moves = game_state.get_valid_moves()
+                    # against the AI its reply is taken back as well, otherwise it would just play it again
+                    while (player_white or player_black) and game_state.moves_made and \
+                            not (player_white if game_state.white_turn else player_black):
+                        game_state.undo_move()
+                    end_game = False
+                    current_square_selected = ()
+                    mouse_clicks = []
+                    move_index = game_state.get_move_index()
                 if e.key == pygame_module.K_r:  # reset when 'r' is pressed
                     game_state = ChessEngine.game_state()
-                    valid_moves = game_state.get_valid_moves()
+                    ChessAI.close_game_search()  # a new game starts new search processes
+                    move_index = game_state.get_move_index()
                     move_made = False
+                    end_game = False
                     current_square_selected = ()
                     mouse_clicks = []
             elif e.type == pygame_module.MOUSEBUTTONDOWN:
@@ -80,76 +116,52 @@ def main():
                     if len(mouse_clicks) == 2:  # after 2nd click
                         move = ChessEngine.move(mouse_clicks[0], mouse_clicks[1], game_state.board)
                         print(move.get_chess_notation())
-                        for i in range(len(valid_moves)):
-                            if move == valid_moves[i]:
-                                game_state.make_move(valid_moves[i])  # valid moves is instead of using player generated move to engine generated move
-                                move_made = True
-                                current_square_selected = ()  # reset user clicks
-                                mouse_clicks = []
+                        valid_move = move_index.find(move)
+                        if valid_move is not None:
+                            game_state.make_move(valid_move)  # valid move is instead of using player generated move to engine generated move
+                            move_made = True
+                            current_square_selected = ()  # reset user clicks
+                            mouse_clicks = []
                         if not move_made:  # preventative for bugs
                             mouse_clicks = [current_square_selected]
 
 
-        #AI move finder
+        #AI move finder, searches in the background and the move is picked up on the first frame after it finishes
         if not end_game and not is_human_turn:
-            ai_move = ChessAI.min_max(game_state,valid_moves)
-            game_state.make_move(ai_move)
-            move_made = True
+            if ai_thinking is None:
+                ai_thinking = ChessAI.ai_worker(game_state, move_index.moves, ai_max_depth, ai_time_limit, ai_workers)
+            elif ai_thinking.done():
+                game_state.make_move(ai_thinking.move)
+                move_made = True
+                ai_thinking = None
 
 
         if move_made:
-            valid_moves = game_state.get_valid_moves()
+            move_index = game_state.get_move_index()
             move_made = False
 
-        create_game_state(screen, game_state, valid_moves, current_square_selected)
-
+        message = None
         if game_state.stale_mate:
             end_game = True
-            create_text(screen, "Stalemate")
+            message = "Stalemate"
         elif game_state.check_mate:
             end_game = True
             if game_state.white_turn:
-                create_text(screen, "Black wins by checkmate")
+                message = "Black wins by checkmate"
             else:
-                create_text(screen, "White wins by checkmate")
-
-
-        pygame_module.display.flip()
-
-
-'''
-Square highlight for piece movement
-'''
-
-def square_highlight(screen, gs, valid_moves, sq_selected):
-    if sq_selected != ():
-        row, file = sq_selected
-        row = int(row)
-        file = int(file)
-        if gs.board[row][file][0] == (
-                'w' if gs.white_turn else 'b'):  # if the piece can actually be moved
-            # highlight the selected square
-                surface_square = pygame_module.Surface((square_size, square_size))
-                surface_square.set_alpha(200)  # value for transparent
-                surface_square.fill(pygame_module.Color('navy'))
-                screen.blit(surface_square, (file * square_size, row * square_size))
-                surface_square.fill(pygame_module.Color('purple'))
-                for move in valid_moves:  # highlight the moves selected piece can take
-                    if move.initial_row == row and move.first_file == file:  # checking the piece is the same one in valid moves
-                        screen.blit(surface_square, (square_size * move.last_file, square_size * move.last_row))
-
-
-
-'''
-Responsible for all the graphics within a current game state
-'''
-
+                message = "White wins by checkmate"
+        elif game_state.draw_reason() is not None:
+            end_game = True
+            message = "Draw by " + game_state.draw_reason()
 
-def create_game_state(screen, gs, valid_moves, sq_selected):  # each function is essentially a layer where
-    # if I put pieces before highlighting the highlighting will overlap the piece aswell
-    create_board(screen)  # draw the squares on the board
-    square_highlight(screen, gs, valid_moves, sq_selected)  # highlight piece when selected
-    create_pieces(screen, gs.board)  # draw pieces on top of those squares
+        dirty = renderer.draw(game_state, move_index, current_square_selected, message, ai_thinking is not None)
+        if dirty:
+            pygame_module.display.update(dirty)
+        idle = not dirty and ai_thinking is None
+        clock.tick(max_fps)
+    if ai_thinking is not None:
+        ai_thinking.cancel()
+    ChessAI.close_game_search()
 
 
 '''
@@ -164,25 +176,97 @@ def create_board(screen):
             color = colors[((r+c)%2)] # because how chessboard work the coords added together if its odd its dark square if its even its light
             pygame_module.draw.rect(screen, color, pygame_module.Rect(c * square_size, r * square_size, square_size, square_size))
 
+
 '''
-Draw the pieces on the board using the current game_state.board
+Draws the game onto the screen, only redrawing what changed since the last frame. The empty board is drawn once onto its
+own surface and squares are copied from it, and fonts, rendered text and highlight surfaces are made once and reused.
+Each square remembers the piece and highlight last drawn on it, so a move, click or undo redraws a handful of squares
+and a frame where nothing happened draws nothing
 '''
 
 
-def create_pieces(screen, board):
-    for row in range(dim):
-        for file in range(dim):
-            piece = board[row][file]
-            if piece != "E":  # not empty square
-                screen.blit(IMAGES[piece], pygame_module.Rect(file * square_size, row * square_size, square_size, square_size))
-
-
-def create_text(screen, text):  # create text function
-    font = pygame_module.font.SysFont("Ariel", 40, True, False)
-    text_obj = font.render(text, 0, pygame_module.Color("Red"))
-    text_loc = pygame_module.Rect(0, 0, square_width, square_height).move(square_width / 2 - text_obj.get_width() / 2,
-                                                                          square_height / 2 - text_obj.get_height() / 2)  # centering text on screen
-    screen.blit(text_obj,text_loc)
-
-
-main()
\ No newline at end of file
+class board_renderer():
+    def __init__(self, screen):
+        self.screen = screen
+        self.board_surface = pygame_module.Surface((square_width, square_height))
+        create_board(self.board_surface)
+        self.highlights = {}
+        for name, colour in (("selected", "navy"), ("target", "purple")):
+            surface_square = pygame_module.Surface((square_size, square_size))
+            surface_square.set_alpha(200)  # value for transparent
+            surface_square.fill(pygame_module.Color(colour))
+            self.highlights[name] = surface_square
+        self.fonts = {}  # SysFont is slow to create, one per size
+        self.texts = {}  # rendered text by (text, size, colour)
+        self.drawn = [None] * 64  # (piece, highlight) last drawn on each square, None means it has to be drawn
+        self.overlays = []  # (text surface, position) drawn over the board last frame
+
+    """
+    Forgets what is on the screen so the next draw does all of it, for when the window has been covered up
+    """
+
+    def invalidate(self):
+        self.drawn = [None] * 64
+
+    def get_text(self, text, size, colour):
+        key = (text, size, colour)
+        if key not in self.texts:
+            if size not in self.fonts:
+                self.fonts[size] = pygame_module.font.SysFont("Ariel", size, True, False)
+            self.texts[key] = self.fonts[size].render(text, 0, pygame_module.Color(colour))
+        return self.texts[key]
+
+    """
+    Draws what changed and returns the rectangles to pass to pygame.display.update, empty if nothing did. message is
+    centred over the board (checkmate and so on) and thinking puts a note in the corner while the AI searches
+    """
+
+    def draw(self, gs, move_index, sq_selected, message=None, thinking=False):
+        highlights = {}
+        if sq_selected != ():
+            row, file = int(sq_selected[0]), int(sq_selected[1])
+            if gs.board[row][file][0] == ('w' if gs.white_turn else 'b'):  # if the piece can actually be moved
+                highlights[row * 8 + file] = "selected"
+                for move in move_index.moves_from(row, file):  # highlight the moves selected piece can take
+                    highlights[move.last_row * 8 + move.last_file] = "target"
+        overlays = []
+        if message is not None:
+            text_obj = self.get_text(message, 40, "Red")
+            overlays.append((text_obj, (square_width / 2 - text_obj.get_width() / 2,
+                                        square_height / 2 - text_obj.get_height() / 2)))  # centering text on screen
+        if thinking:
+            overlays.append((self.get_text("Thinking...", 24, "Gray"), (4, 4)))
+        if overlays != self.overlays:  # text that has gone leaves the squares under it to be drawn again
+            for text_obj, position in self.overlays:
+                covered = text_obj.get_rect(topleft=position)
+                for sq in range(64):
+                    if covered.colliderect(self.square_rect(sq)):
+                        self.drawn[sq] = None
+
+        dirty = []
+        for sq in range(64):
+            row, file = divmod(sq, dim)
+            state = (gs.board[row][file], highlights.get(sq))
+            if state == self.drawn[sq]:
+                continue
+            self.drawn[sq] = state
+            rect = self.square_rect(sq)
+            self.screen.blit(self.board_surface, rect, rect)  # the square without anything on it
+            if state[1] is not None:
+                self.screen.blit(self.highlights[state[1]], rect)
+            if state[0] != "E":
+                self.screen.blit(IMAGES[state[0]], rect)
+            dirty.append(rect)
+        if dirty or overlays != self.overlays:  # text goes on top of any squares just drawn under it
+            for text_obj, position in overlays:
+                dirty.append(self.screen.blit(text_obj, position))
+        self.overlays = overlays
+        return dirty
+
+    def square_rect(self, sq):
+        row, file = divmod(sq, dim)
+        return pygame_module.Rect(file * square_size, row * square_size, square_size, square_size)
+
+
+if __name__ == "__main__":  # the search processes import this module again on some platforms, they mustn't open a window
+    main()
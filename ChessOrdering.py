@@ -0,0 +1,154 @@
+"""
+Move ordering for the alpha-beta search. Alpha-beta only prunes when a good move is searched first, so moves are sorted
+before each node is searched:
+    1) the transposition table move (best move found last time this position was searched)
+    2) captures, most valuable victim first and then least valuable attacker (MVV-LVA)
+    3) killer moves, quiet moves that caused a cut-off at the same ply elsewhere in the tree
+    4) other quiet moves by history score, how often that from/to pair has caused cut-offs
+Moves are the packed ints from game_state.get_packed_moves, so everything is read straight from their bits. Also the
+static exchange evaluation the quiescence search uses to skip captures that lose material.
+"""
+
+import ChessBitboard
+from ChessBitboard import SQUARE_BITS
+from ChessEngine import PIECES, PROMOTION_TYPES
+from ChessEval import PIECE_VALUES
+
+TABLE_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+KILLER_SCORES = (1 << 27, (1 << 27) - 1)  # the newer killer slot is tried first
+HISTORY_LIMIT = 1 << 26  # history is halved when a score reaches this so it never outranks killers
+QUEEN_PROMOTION = 4  # promotion field of a packed move that queens
+MAX_PLY = 128
+# indexed by the piece codes in a packed move: captured piece is PIECES index + 1 (0 for nothing), moved piece is the index
+VICTIM_SCORES = [0] + [PIECE_VALUES[piece[1]] * 16 for piece in PIECES]
+ATTACKER_SCORES = [(PIECE_VALUES[piece[1]] if piece[1] != 'K' else 2000) // 16 for piece in PIECES]  # king captures last
+QUEENING_SCORE = PIECE_VALUES['Q'] * 16
+EXCHANGE_VALUES = dict(PIECE_VALUES, K=20000)  # taking with the king last, and never into a defended square
+EXCHANGE_ORDER = ('p', 'N', 'B', 'R', 'Q', 'K')  # least valuable attacker first
+
+
+class move_orderer():
+    def __init__(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]  # the two latest killer moves (packed) at each ply
+        self.history = [0] * 4096  # indexed by the from and to squares, the low 12 bits of a packed move
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.table_move_cutoffs = 0
+        self.killer_cutoffs = 0
+
+    """
+    Killers are only useful within a search, history is kept but halved so older results count for less
+    """
+
+    def new_search(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = [score >> 1 for score in self.history]
+        self.cutoffs = self.first_move_cutoffs = self.table_move_cutoffs = self.killer_cutoffs = 0
+
+    """
+    Forgets the history too, so a search doesn't depend on what was searched before it
+    """
+
+    def clear(self):
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        self.history = [0] * 4096
+        self.cutoffs = self.first_move_cutoffs = self.table_move_cutoffs = self.killer_cutoffs = 0
+
+    """
+    Sorts packed moves in place, best first. table_move may be None
+    """
+
+    def order_moves(self, moves, table_move, ply):
+        killer_1, killer_2 = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+
+        def score(packed):
+            if packed == table_move:
+                return TABLE_MOVE_SCORE
+            captured = (packed >> 21) & 15
+            queening = (packed >> 14) & 7 == QUEEN_PROMOTION
+            if captured or queening:
+                return CAPTURE_SCORE + VICTIM_SCORES[captured] - ATTACKER_SCORES[(packed >> 17) & 15] + \
+                    (QUEENING_SCORE if queening else 0)
+            if packed == killer_1:
+                return KILLER_SCORES[0]
+            if packed == killer_2:
+                return KILLER_SCORES[1]
+            return history[packed & 4095]
+
+        moves.sort(key=score, reverse=True)
+
+    """
+    Called when a packed move caused a beta cut-off. index is where it came in the ordered list, 0 meaning the first
+    move tried
+    """
+
+    def record_cutoff(self, packed, table_move, ply, depth, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if packed == table_move:
+            self.table_move_cutoffs += 1
+        if (packed >> 21) & 15 or (packed >> 14) & 7:
+            return  # captures and promotions are already ordered well by MVV-LVA
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if packed == killers[0] or packed == killers[1]:
+                self.killer_cutoffs += 1
+            if packed != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = packed
+        index = packed & 4095
+        self.history[index] += depth * depth  # deeper cut-offs save more work so they count for more
+        if self.history[index] >= HISTORY_LIMIT:
+            self.history = [score >> 1 for score in self.history]
+
+    def get_stats(self):
+        return {"cutoffs": self.cutoffs, "first_move_cutoffs": self.first_move_cutoffs,
+                "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+                "table_move_cutoffs": self.table_move_cutoffs, "killer_cutoffs": self.killer_cutoffs}
+
+
+"""
+Static exchange evaluation: the material the side making the packed capture ends up with, in centipawns, if both
+sides keep recapturing on that square with their least valuable attacker and either may stop when it no longer pays.
+Attackers come from the bitboards, and taking a piece off the occupancy each time lets sliders behind it join in
+"""
+
+
+def static_exchange(game_state, packed):
+    bitboards = game_state.bitboards
+    from_sq = packed & 63
+    to_sq = (packed >> 6) & 63
+    moved = PIECES[(packed >> 17) & 15]
+    captured = (packed >> 21) & 15
+    promotion = PROMOTION_TYPES[(packed >> 14) & 7]
+    gains = [PIECE_VALUES[PIECES[captured - 1][1]] if captured else 0]
+    on_square = EXCHANGE_VALUES[moved[1]]  # value of the piece now standing on to_sq, the next one to be taken
+    if promotion is not None:
+        gains[0] += PIECE_VALUES[promotion] - PIECE_VALUES['p']
+        on_square = PIECE_VALUES[promotion]
+    occupied = (game_state.colour_bitboards['w'] | game_state.colour_bitboards['b']) ^ SQUARE_BITS[from_sq]
+    if (packed >> 12) & 3 == 1:  # en passant, the captured pawn isn't on to_sq
+        occupied ^= SQUARE_BITS[to_sq + (8 if moved[0] == 'w' else -8)]
+    side = 'b' if moved[0] == 'w' else 'w'
+    while True:
+        attackers = ChessBitboard.attackers_to(bitboards, to_sq, side, occupied) & occupied
+        if not attackers:
+            break
+        for piece_type in EXCHANGE_ORDER:
+            attacker = attackers & bitboards[side + piece_type]
+            if attacker:
+                break
+        if piece_type == 'K' and ChessBitboard.attackers_to(bitboards, to_sq, 'w' if side == 'b' else 'b',
+                                                            occupied) & occupied:
+            break  # the king can't take a defended piece
+        gains.append(on_square - gains[-1])
+        on_square = EXCHANGE_VALUES[piece_type]
+        occupied ^= attacker & -attacker
+        side = 'w' if side == 'b' else 'b'
+    while len(gains) > 1:  # each side takes the better of stopping or carrying on, working back from the end
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
@@ -0,0 +1,171 @@
+"""
+PGN (Portable Game Notation) reading and SAN (Standard Algebraic Notation) moves. Games are read one at a time from an
+open file so a large PGN never has to fit in memory, and SAN is turned into the engine's move objects by writing the
+SAN of each legal move and matching it.
+"""
+
+import re
+
+import ChessEngine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+SAN_PARTS = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])([NBRQ])?$")
+
+
+"""
+SAN of move in game_state, e.g. "Nbd7", "exd5", "e8=Q+", "O-O". valid_moves are the legal moves in the position,
+needed to tell apart two pieces that can reach the same square. The check suffix means making the move, so it can be
+left off with check_suffix=False
+"""
+
+
+def move_to_san(game_state, move, valid_moves, check_suffix=True):
+    if move.is_castle_move:
+        san = "O-O" if move.last_file > move.first_file else "O-O-O"
+    else:
+        piece_type = move.piece_moved[1]
+        destination = move.get_coordinates(move.last_row, move.last_file)
+        capture = move.piece_captured != "E"
+        if piece_type == 'p':
+            san = (move.get_coordinates(move.initial_row, move.first_file)[0] + "x" if capture else "") + destination
+            if move.promotion_piece is not None:
+                san += "=" + move.promotion_piece
+        else:
+            others = [other for other in valid_moves if other.piece_moved == move.piece_moved and other != move and
+                      (other.last_row, other.last_file) == (move.last_row, move.last_file)]
+            origin = move.get_coordinates(move.initial_row, move.first_file)
+            if not others:
+                disambiguation = ""
+            elif all(other.first_file != move.first_file for other in others):
+                disambiguation = origin[0]
+            elif all(other.initial_row != move.initial_row for other in others):
+                disambiguation = origin[1]
+            else:
+                disambiguation = origin
+            san = piece_type + disambiguation + ("x" if capture else "") + destination
+    if check_suffix:
+        game_state.make_move(move)
+        if game_state.in_check():
+            san += "#" if len(game_state.get_valid_moves()) == 0 else "+"
+        game_state.undo_move()
+    return san
+
+
+"""
+The move in valid_moves that san describes, or None. Check marks, annotations like "!?" and a missing "=" before the
+promotion piece are all accepted
+"""
+
+
+def san_to_move(game_state, san, valid_moves):
+    san = san.rstrip("+#!?").replace("0", "O").replace("=", "")
+    for valid_move in valid_moves:
+        if move_to_san(game_state, valid_move, valid_moves, False).replace("=", "") == san:
+            return valid_move
+    # not exact SAN, often a piece named by its square when the other one couldn't legally move there ("Nge2" with
+    # the c3 knight pinned), so match on the parts given instead
+    parts = SAN_PARTS.match(san)
+    if parts is None:
+        return None
+    piece_type, from_file, from_rank, destination, promotion = parts.groups()
+    matches = [valid_move for valid_move in valid_moves if not valid_move.is_castle_move and
+               valid_move.piece_moved[1] == (piece_type or 'p') and
+               valid_move.get_coordinates(valid_move.last_row, valid_move.last_file) == destination and
+               (not from_file or valid_move.get_coordinates(valid_move.initial_row, valid_move.first_file)[0] == from_file) and
+               (not from_rank or valid_move.get_coordinates(valid_move.initial_row, valid_move.first_file)[1] == from_rank) and
+               valid_move.promotion_piece == (promotion or (None if valid_move.promotion_piece is None else 'Q'))]
+    return matches[0] if len(matches) == 1 else None
+
+
+"""
+Removes comments, variations, NAGs and move numbers from movetext, leaving the SAN moves and result as a list
+"""
+
+
+def movetext_tokens(movetext):
+    tokens = []
+    depth = 0  # how many variations deep, moves inside a variation aren't part of the game
+    for token in re.split(r"(\{[^}]*\}|;[^\n]*|\(|\)|\s+)", movetext):
+        if not token or token.isspace() or token[0] in "{;":
+            continue
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token[0] != "$":
+            token = MOVE_NUMBER.sub("", token)
+            if token:
+                tokens.append(token)
+    return tokens
+
+
+"""
+Yields (headers, sans, result) for each game in an open PGN file, reading it line by line. headers is a dict of the
+tag pairs and sans the list of SAN moves
+"""
+
+
+def read_games(stream):
+    headers = {}
+    movetext = []
+    for line in stream:
+        line = line.strip().lstrip("\ufeff")  # a byte order mark opening the file
+        tag = TAG.match(line)
+        if tag is not None:
+            if movetext:  # a new game's tags without a result after the last game's moves
+                yield finish_game(headers, movetext)
+                headers, movetext = {}, []
+            headers[tag.group(1)] = tag.group(2)
+        elif line:
+            movetext.append(line)
+            if line.split()[-1] in RESULTS:
+                yield finish_game(headers, movetext)
+                headers, movetext = {}, []
+    if movetext or headers:
+        yield finish_game(headers, movetext)
+
+
+def finish_game(headers, movetext):
+    tokens = movetext_tokens("\n".join(movetext))
+    result = headers.get("Result", "*")
+    if tokens and tokens[-1] in RESULTS:
+        result = tokens.pop()
+    return headers, tokens, result
+
+
+"""
+The game_state a game starts from: its FEN tag, or the usual start without one. Raises ValueError if the tag can't be
+read
+"""
+
+
+def start_position(headers, use_bitboards=True):
+    return ChessEngine.game_state(use_bitboards, headers.get("FEN"))
+
+
+"""
+Plays sans out from game_state and yields (game_state, move) before each move is made. Stops at the first move that
+can't be read, so a corrupt game gives its legal start rather than an error
+"""
+
+
+def play_moves(game_state, sans):
+    for san in sans:
+        valid_moves = game_state.get_valid_moves()
+        move = san_to_move(game_state, san, valid_moves)
+        if move is None:
+            return
+        yield game_state, move
+        game_state.make_move(move)
+
+
+"""
+play_moves from the position in headers. A FEN tag that can't be read raises ValueError before anything is yielded, as
+there is no start to give
+"""
+
+
+def replay(headers, sans, use_bitboards=True):
+    return play_moves(start_position(headers, use_bitboards), sans)
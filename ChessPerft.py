@@ -0,0 +1,199 @@
+"""
+Perft (performance test) for the move generator. Counts every position reachable in exactly n moves and compares the
+totals with published values for standard test positions, which catches almost any mistake in checks, pins, castling,
+en passant or make/undo. It also times the run so generator changes can be measured in nodes per second.
+
+Imports only the engine, not pygame, so it runs headless:
+    python ChessPerft.py                 run every reference position to its default depth
+    python ChessPerft.py --depth 4       go deeper (only where a reference value is known)
+    python ChessPerft.py --divide "<fen>" 3    node count under each root move, for tracking down a wrong total
+    python -m pytest ChessPerft.py       the same checks as tests
+"""
+
+import argparse
+import time
+
+import ChessEngine
+
+STARTING_FEN = ChessEngine.STARTING_FEN
+
+# (name, fen, node counts for depth 1, 2, 3...) from the chessprogramming wiki perft results page
+PERFT_POSITIONS = [
+    ("start", STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+]
+DEFAULT_DEPTH = 3
+
+
+"""
+Builds a game_state from FEN (Forsyth-Edwards Notation)
+"""
+
+
+def load_fen(fen, use_bitboards=True):
+    return ChessEngine.game_state(use_bitboards, fen)
+
+
+"""
+Number of positions exactly depth moves ahead. The last ply just counts the legal moves instead of making them. Works
+on packed moves so no move objects are built, the legacy generator only makes objects so their packed ints are used
+"""
+
+
+def perft(gs, depth):
+    if gs.use_bitboards:
+        moves = gs.get_packed_moves()
+    else:
+        moves = [move.packed for move in gs.get_valid_moves()]
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.make_packed_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+"""
+Perft split by root move, as {notation: nodes}, to compare with another engine's divide output
+"""
+
+
+def divide(gs, depth):
+    results = {}
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        results[move.get_chess_notation()] = perft(gs, depth - 1)
+        gs.undo_move()
+    return results
+
+
+"""
+Runs perft on every reference position up to max_depth. Returns one dict per position and depth with the node count,
+the expected count, whether they match and the speed
+"""
+
+
+def run_suite(max_depth=DEFAULT_DEPTH, use_bitboards=True):
+    results = []
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen, use_bitboards)
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            seconds = time.perf_counter() - start
+            results.append({"position": name, "depth": depth, "nodes": nodes, "expected": expected[depth - 1],
+                            "passed": nodes == expected[depth - 1], "seconds": seconds,
+                            "nodes_per_second": nodes / seconds if seconds > 0 else 0.0})
+    return results
+
+
+def print_suite(results):
+    total_nodes = sum(result["nodes"] for result in results)
+    total_seconds = sum(result["seconds"] for result in results)
+    for result in results:
+        print("%-12s depth %d  %10d nodes  %s  %8.2fs  %9.0f nodes/s" % (
+            result["position"], result["depth"], result["nodes"],
+            "ok" if result["passed"] else "FAIL (expected %d)" % result["expected"], result["seconds"],
+            result["nodes_per_second"]))
+    print("total %d nodes in %.2fs, %.0f nodes/s" % (total_nodes, total_seconds,
+                                                     total_nodes / total_seconds if total_seconds > 0 else 0.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft node counts and speed for the ChessEngine move generator")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="deepest depth to run for each position")
+    parser.add_argument("--divide", nargs=2, metavar=("FEN", "DEPTH"), help="print the perft of each root move")
+    parser.add_argument("--legacy", action="store_true", help="use the board-scanning generator instead of bitboards")
+    args = parser.parse_args()
+    if args.divide:
+        gs = load_fen(args.divide[0], not args.legacy)
+        results = divide(gs, int(args.divide[1]))
+        for notation in sorted(results):
+            print(notation, results[notation])
+        print("total", sum(results.values()))
+        return
+    results = run_suite(args.depth, not args.legacy)
+    print_suite(results)
+    if not all(result["passed"] for result in results):
+        raise SystemExit(1)
+
+
+"""
+pytest entry points (collected through pytest.ini), shallow enough to run on every change
+"""
+
+
+def test_reference_positions():
+    for result in run_suite(DEFAULT_DEPTH):
+        assert result["passed"], result
+
+
+def test_legacy_generator_agrees():
+    for result in run_suite(2, use_bitboards=False):
+        assert result["passed"], result
+
+
+def test_make_undo_restores_position():
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen)
+        before = ([row[:] for row in gs.board], gs.zobrist_key, gs.material_score, gs.position_score, gs.enpassant_possible,
+                  gs.current_castle_rights.get_mask(), dict(gs.bitboards), gs.halfmove_clock, dict(gs.key_counts))
+        perft(gs, 3)
+        after = ([row[:] for row in gs.board], gs.zobrist_key, gs.material_score, gs.position_score, gs.enpassant_possible,
+                 gs.current_castle_rights.get_mask(), dict(gs.bitboards), gs.halfmove_clock, dict(gs.key_counts))
+        assert before == after, name
+
+
+def test_fen_round_trip():
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen)
+        assert gs.get_fen() == fen, name
+        assert gs.zobrist_key == ChessEngine.ChessZobrist.compute_key(gs), name
+
+
+def test_clone_matches_position():
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen)
+        for move in gs.get_valid_moves()[:3]:  # clone part way into a game, not just straight after loading
+            gs.make_move(move)
+            copy = gs.clone()
+            assert (copy.get_fen(), copy.zobrist_key, copy.material_score, copy.position_score, copy.bitboards) == \
+                (gs.get_fen(), gs.zobrist_key, gs.material_score, gs.position_score, gs.bitboards), name
+            assert perft(copy, 2) == perft(gs, 2), name
+            gs.undo_move()
+        assert gs.get_fen() == fen, name  # undo puts the move counters back too
+
+
+def test_repetition_and_fifty_moves():
+    gs = load_fen(ChessEngine.STARTING_FEN)
+    shuffle = ["g1f3", "g8f6", "f3g1", "f6g8"]
+    for notation in shuffle * 2:
+        assert gs.draw_reason() is None
+        gs.make_move(next(move for move in gs.get_valid_moves() if move.get_chess_notation() == notation))
+    assert gs.repetition_count() == 2 and gs.draw_reason() == "threefold repetition"
+    assert gs.clone().repetition_count() == 2  # the search works on a clone and has to see the game's positions
+    gs.undo_move()
+    assert gs.repetition_count() == 1 and gs.draw_reason() is None
+    assert load_fen("8/8/4k3/8/8/3RK3/8/8 w - - 99 80").draw_reason() is None
+    assert load_fen("8/8/4k3/8/8/3RK3/8/8 w - - 100 80").draw_reason() == "fifty-move rule"
+
+
+def test_bitboard_generator_is_faster():
+    fen = PERFT_POSITIONS[1][1]
+    timings = []
+    for use_bitboards in (True, False):
+        gs = load_fen(fen, use_bitboards)
+        start = time.perf_counter()
+        perft(gs, 2)
+        timings.append(time.perf_counter() - start)
+    assert timings[0] < timings[1], timings
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Instrumentation for seeing where a search spends its time. A search_stats object is opt-in: while it is attached to a
+game_state (game_state.stats) the move generator, attack checks and leaf evaluation count themselves into it, and the
+search fills in nodes, transposition table probes and the time of each depth when it finishes. With nothing attached
+every counter is skipped by a single "is None" check, so it can be left on in play as well.
+
+    python ChessAI.py --depth 5 --stats         search once and print the stats as JSON
+    python ChessAI.py --depth 5 --profile       search once under cProfile and print the busiest functions
+"""
+
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+# negamax_search counters copied into the stats, as the difference over the search since they count from when the
+# search object was made
+PRUNING_COUNTERS = ("delta_pruned", "exchange_pruned", "draw_cutoffs", "null_move_tries", "null_move_cutoffs",
+                    "reduced_moves", "reduction_researches")
+
+class search_stats():
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0  # positions searched full width
+        self.quiescence_nodes = 0
+        self.evaluations = 0  # leaf scores read
+        self.valid_move_calls = 0  # get_valid_moves
+        self.move_generations = 0  # get_packed_moves, which get_valid_moves goes through with bitboards
+        self.moves_generated = 0  # total moves those generations returned, for the branching factor
+        self.attack_checks = 0  # square_under_attack
+        self.table_probes = 0
+        self.table_hits = 0
+        self.phase_seconds = {}  # seconds spent in each named phase
+        self.depth_nodes = []  # nodes in each finished depth, for the effective branching factor
+        self.pruning = {}
+        self.seconds = 0.0
+        self.started = None
+        self.table = None
+        self.table_before = (0, 0)
+        self.pruning_before = {}
+
+    """
+    Starts counting a new search of game_state, forgetting the last one. table is the transposition table it probes
+    and search the negamax_search about to run, if any, whose pruning counters carry on across its searches
+    """
+
+    def begin(self, game_state, table=None, search=None):
+        self.reset()
+        self.table = table
+        if table is not None:
+            self.table_before = (table.probes, table.hits)
+        if search is not None:
+            self.pruning_before = {name: getattr(search, name) for name in PRUNING_COUNTERS}
+        game_state.stats = self
+        self.started = time.perf_counter()
+
+    """
+    Stops counting. search is the negamax_search that ran, if any, for its node counts and depths. nodes is the count
+    for searches without their own counters
+    """
+
+    def finish(self, game_state, search=None, nodes=0):
+        self.seconds = time.perf_counter() - self.started
+        game_state.stats = None
+        if self.table is not None:
+            self.table_probes = self.table.probes - self.table_before[0]
+            self.table_hits = self.table.hits - self.table_before[1]
+            self.table = None
+        self.nodes = nodes
+        if search is not None:
+            self.nodes = search.nodes - search.nodes_before
+            self.quiescence_nodes = search.quiescence_nodes - search.quiescence_before
+            self.pruning = {name: getattr(search, name) - self.pruning_before.get(name, 0) for name in PRUNING_COUNTERS}
+            previous = 0.0
+            for iteration in search.iterations:
+                self.phase_seconds["depth %d" % iteration["depth"]] = iteration["seconds"] - previous
+                previous = iteration["seconds"]
+                self.depth_nodes.append(iteration["nodes"] + iteration["quiescence_nodes"])
+
+    def add_time(self, phase, seconds):
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    def get_stats(self):
+        total_nodes = self.nodes + self.quiescence_nodes
+        return {"seconds": self.seconds, "nodes": self.nodes, "quiescence_nodes": self.quiescence_nodes,
+                "nodes_per_second": total_nodes / self.seconds if self.seconds > 0 else 0.0,
+                "evaluations": self.evaluations, "valid_move_calls": self.valid_move_calls,
+                "move_generations": self.move_generations, "attack_checks": self.attack_checks,
+                "table_probes": self.table_probes, "table_hits": self.table_hits,
+                "table_hit_rate": self.table_hits / self.table_probes if self.table_probes else 0.0,
+                # average moves per generated position, and how many times more nodes each depth took than the last
+                "branching_factor": self.moves_generated / self.move_generations if self.move_generations else 0.0,
+                "effective_branching_factor": self.depth_nodes[-1] / self.depth_nodes[-2]
+                if len(self.depth_nodes) >= 2 and self.depth_nodes[-2] else 0.0,
+                "phase_seconds": dict(self.phase_seconds), "pruning": dict(self.pruning)}
+
+    def to_json(self):
+        return json.dumps(self.get_stats(), indent=1)
+
+
+"""
+Calls function(*args, **kwargs) under cProfile, prints the limit busiest functions sorted by sort to stream and
+returns what function returned
+"""
+
+
+def profile(function, *args, sort="cumulative", limit=25, stream=None, **kwargs):
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    pstats.Stats(profiler, stream=stream or sys.stdout).strip_dirs().sort_stats(sort).print_stats(limit)
+    return result
@@ -0,0 +1,203 @@
+"""
+Endgame tablebases for king and queen or king and rook against a lone king. Every position is solved offline by
+retrograde analysis: start from the checkmates and work backwards one move at a time, so each position gets its exact
+distance to mate with best play. The tables are files with one byte per position, memory-mapped when used, so a probe
+is a few arithmetic steps and one byte read.
+
+A table is indexed as if white has the extra piece, black's pieces are flipped onto white's side when probing:
+    index = side to move (0 white, 1 black) << 18 | white king square << 12 | black king square << 6 | piece square
+The byte is 0 for a draw (or an impossible position) and otherwise the number of plies to mate plus one, a win when
+white is to move and a loss when black is. Files start with an 8-byte header, MAGIC then the piece letter and padding.
+
+    python ChessTablebase.py build                  build KQvK.tb and KRvK.tb in the tablebases folder
+    python ChessTablebase.py probe "<fen>"          result and distance to mate for a position
+"""
+
+import argparse
+import mmap
+import os
+import time
+
+import ChessBitboard
+from ChessBitboard import KING_ATTACKS, SQUARE_BITS
+
+MAGIC = b"CGTB"
+HEADER_SIZE = 8
+TABLE_SIZE = 2 << 18
+DEFAULT_DIRECTORY = "tablebases"
+ATTACKS = {'Q': ChessBitboard.queen_attacks, 'R': ChessBitboard.rook_attacks}
+WIN = 1
+DRAW = 0
+LOSS = -1
+EXTRA_PIECES = ("wQ", "wR", "wB", "wN", "wp", "bQ", "bR", "bB", "bN", "bp")  # everything but the kings
+
+
+def table_name(piece_type):
+    return "K%svK.tb" % piece_type
+
+
+"""
+Solves king and piece_type against king. Returns a bytearray of TABLE_SIZE bytes laid out as described at the top of
+the file
+"""
+
+
+def generate(piece_type):
+    attacks = ATTACKS[piece_type]
+    table = bytearray(TABLE_SIZE)
+    black_moves = bytearray(TABLE_SIZE)  # black's moves not yet known to lose, for black to move positions
+    legal = bytearray(TABLE_SIZE)
+    frontier = []  # positions decided at the current distance
+
+    # checkmates, and how many moves each black to move position has
+    for white_king in range(64):
+        for black_king in range(64):
+            if black_king == white_king or KING_ATTACKS[white_king] & SQUARE_BITS[black_king]:
+                continue
+            for piece in range(64):
+                if piece == white_king or piece == black_king:
+                    continue
+                occupied = SQUARE_BITS[white_king] | SQUARE_BITS[black_king] | SQUARE_BITS[piece]
+                index = white_king << 12 | black_king << 6 | piece
+                in_check = attacks(piece, occupied) & SQUARE_BITS[black_king]
+                if not in_check:
+                    legal[index] = 1  # white can't be to move with black in check
+                legal[1 << 18 | index] = 1
+                covered = attacks(piece, occupied ^ SQUARE_BITS[black_king]) | KING_ATTACKS[white_king]
+                moves = ChessBitboard.pop_count(KING_ATTACKS[black_king] & ~covered)  # taking an unguarded piece draws
+                black_moves[1 << 18 | index] = moves
+                if moves == 0 and in_check:
+                    table[1 << 18 | index] = 1  # mated, 0 plies to go
+                    frontier.append(1 << 18 | index)
+
+    # work backwards: a white move into a lost black position wins, a black position loses once all its moves do
+    plies = 0
+    while frontier:
+        plies += 1
+        next_frontier = []
+        for index in frontier:
+            white_king, black_king, piece = index >> 12 & 63, index >> 6 & 63, index & 63
+            occupied = SQUARE_BITS[white_king] | SQUARE_BITS[black_king] | SQUARE_BITS[piece]
+            if index >> 18:  # black to move and lost, every white move that gets here wins
+                for origin in ChessBitboard.squares(KING_ATTACKS[white_king] & ~occupied & ~KING_ATTACKS[black_king]):
+                    previous = origin << 12 | black_king << 6 | piece
+                    if legal[previous] and not table[previous]:
+                        table[previous] = plies + 1
+                        next_frontier.append(previous)
+                for origin in ChessBitboard.squares(attacks(piece, occupied) & ~occupied):
+                    previous = white_king << 12 | black_king << 6 | origin
+                    if legal[previous] and not table[previous]:
+                        table[previous] = plies + 1
+                        next_frontier.append(previous)
+            else:  # white to move and winning, a black move that gets here is one less way out
+                for origin in ChessBitboard.squares(KING_ATTACKS[black_king] & ~occupied & ~KING_ATTACKS[white_king]):
+                    previous = 1 << 18 | white_king << 12 | origin << 6 | piece
+                    if legal[previous] and not table[previous]:
+                        black_moves[previous] -= 1
+                        if black_moves[previous] == 0:
+                            table[previous] = plies + 1
+                            next_frontier.append(previous)
+        frontier = next_frontier
+    return table
+
+
+def write_table(table, piece_type, directory=DEFAULT_DIRECTORY):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, table_name(piece_type)), "wb") as output:
+        output.write(MAGIC + piece_type.encode() + bytes(HEADER_SIZE - len(MAGIC) - 1))
+        output.write(table)
+
+
+"""
+The tables found in a folder, memory-mapped. probe answers for any position with two kings and at most one other
+piece: queen and rook endings from the tables, bare kings and a lone minor piece are draws
+"""
+
+
+class tablebase():
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.files = []
+        self.tables = {}
+        for piece_type in ATTACKS:
+            path = os.path.join(directory, table_name(piece_type))
+            if not os.path.exists(path):
+                continue
+            table_file = open(path, "rb")
+            data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:len(MAGIC)] != MAGIC or len(data) != HEADER_SIZE + TABLE_SIZE:
+                raise ValueError(path + " is not a tablebase file")
+            self.files.append((table_file, data))
+            self.tables[piece_type] = data
+
+    """
+    (result, plies) for the player to move, result being WIN, DRAW or LOSS and plies the distance to mate, or None if
+    the position isn't covered
+    """
+
+    def probe(self, game_state):
+        colour_bitboards = game_state.colour_bitboards
+        occupied = colour_bitboards['w'] | colour_bitboards['b']
+        if bin(occupied).count("1") > 3:
+            return None
+        bitboards = game_state.bitboards
+        for piece in EXTRA_PIECES:
+            if bitboards[piece]:
+                break
+        else:
+            return DRAW, 0  # bare kings
+        piece_type = piece[1]
+        if piece_type in ('N', 'B'):
+            return DRAW, 0  # can't force mate
+        if piece_type not in self.tables:
+            return None  # pawns, or a table that hasn't been built
+        white_king = bitboards["wK"].bit_length() - 1
+        black_king = bitboards["bK"].bit_length() - 1
+        piece_square = bitboards[piece].bit_length() - 1
+        strong_to_move = game_state.white_turn
+        if piece[0] == 'b':  # flip the board so the side with the piece is white
+            white_king, black_king, piece_square = black_king ^ 56, white_king ^ 56, piece_square ^ 56
+            strong_to_move = not strong_to_move
+        value = self.tables[piece_type][HEADER_SIZE + ((0 if strong_to_move else 1) << 18 | white_king << 12 |
+                                                       black_king << 6 | piece_square)]
+        if value == 0:
+            return DRAW, 0
+        return (WIN if strong_to_move else LOSS), value - 1
+
+    def close(self):
+        for table_file, data in self.files:
+            data.close()
+            table_file.close()
+        self.files = []
+        self.tables = {}
+
+
+def main():
+    import ChessEngine
+    parser = argparse.ArgumentParser(description="Build or look up the endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="solve the endings and write the tables")
+    build.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    build.add_argument("--pieces", nargs="+", choices=sorted(ATTACKS), default=sorted(ATTACKS))
+    probe = commands.add_parser("probe", help="look a position up")
+    probe.add_argument("fen")
+    probe.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    args = parser.parse_args()
+    if args.command == "build":
+        for piece_type in args.pieces:
+            start = time.perf_counter()
+            table = generate(piece_type)
+            write_table(table, piece_type, args.directory)
+            print("%s: %d wins, longest mate %d plies, %.1fs" % (table_name(piece_type), sum(1 for value in table if value),
+                                                                  max(table) - 1, time.perf_counter() - start))
+        return
+    tables = tablebase(args.directory)
+    result = tables.probe(ChessEngine.game_state(fen=args.fen))
+    if result is None:
+        print("not in the tablebases")
+    else:
+        print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result[0]], "in %d plies" % result[1] if result[0] != DRAW else "")
+    tables.close()
+
+
+if __name__ == "__main__":
+    main()
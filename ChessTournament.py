@@ -0,0 +1,222 @@
+"""
+Headless games between the AIs in ChessAI, for measuring engine changes by results rather than one game at a time.
+Every pair of engines plays a number of games, swapping colours each game, spread across a pool of processes. Each
+game's result, length, time and nodes per second go to a JSON file along with win/draw/loss totals for each engine.
+
+Imports only the engine and AI, not pygame:
+    python ChessTournament.py --engines greedy minmax negamax --games 10 --depth 3
+    python ChessTournament.py --engines negamax random --games 20 --time 0.2 --output results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import ChessAI
+import ChessEngine
+
+MAX_PLIES = 300  # a game still going after this many moves is scored as a draw
+DEFAULT_OUTPUT = "tournament.json"
+
+
+"""
+Each engine takes (game_state, valid_moves, max_depth, time_limit) and returns one of valid_moves. Engines that don't
+search ignore the limits. Add new engines here to enter them in tournaments
+"""
+
+
+def random_engine(game_state, valid_moves, max_depth, time_limit):
+    return ChessAI.random_ai(valid_moves)
+
+
+def greedy_engine(game_state, valid_moves, max_depth, time_limit):
+    return ChessAI.greedy_algorithm(game_state, valid_moves)
+
+
+def min_max_engine(game_state, valid_moves, max_depth, time_limit):
+    move = ChessAI.min_max(game_state, valid_moves)
+    ChessAI.last_search = ChessAI.last_min_max  # for its node count
+    return move
+
+
+def negamax_engine(game_state, valid_moves, max_depth, time_limit):
+    return ChessAI.find_best_move(game_state, valid_moves, max_depth, time_limit)
+
+
+"""
+The negamax AI with null-move pruning and late move reductions switched on or off, to measure each against negamax
+(which has both) on its own or together
+"""
+
+
+def pruning_engine(game_state, valid_moves, max_depth, time_limit, null_move, late_move_reductions):
+    move = ChessAI.known_move(game_state, valid_moves)
+    if move is not None:
+        ChessAI.last_search = None
+        return move
+    ChessAI.last_search = ChessAI.negamax_search(max_depth, time_limit, null_move=null_move,
+                                                 late_move_reductions=late_move_reductions)
+    return ChessAI.last_search.search(game_state, valid_moves)
+
+
+def full_width_engine(game_state, valid_moves, max_depth, time_limit):
+    return pruning_engine(game_state, valid_moves, max_depth, time_limit, False, False)
+
+
+def no_null_move_engine(game_state, valid_moves, max_depth, time_limit):
+    return pruning_engine(game_state, valid_moves, max_depth, time_limit, False, True)
+
+
+def no_reductions_engine(game_state, valid_moves, max_depth, time_limit):
+    return pruning_engine(game_state, valid_moves, max_depth, time_limit, True, False)
+
+
+ENGINES = {
+    "random": random_engine,
+    "greedy": greedy_engine,
+    "minmax": min_max_engine,
+    "negamax": negamax_engine,
+    "fullwidth": full_width_engine,
+    "nonull": no_null_move_engine,
+    "nolmr": no_reductions_engine,
+}
+
+
+"""
+Plays one game and returns its record. task is (white, black, max_depth, time_limit, seed), engine names from ENGINES
+"""
+
+
+def play_game(task):
+    white, black, max_depth, time_limit, seed = task
+    random.seed(seed)  # the AIs break ties at random, the seed makes a game repeatable
+    # along with starting from empty tables, rather than whatever games this process played before
+    ChessAI.transposition_table.clear()
+    ChessAI.min_max_table.clear()
+    ChessAI.move_ordering.clear()
+    game_state = ChessEngine.game_state()
+    engines = {True: white, False: black}
+    seconds = {white: 0.0, black: 0.0} if white != black else {white: 0.0}
+    nodes = dict.fromkeys(seconds, 0)
+    moves = []
+    valid_moves = game_state.get_valid_moves()
+    while valid_moves and game_state.draw_reason() is None and len(moves) < MAX_PLIES:
+        name = engines[game_state.white_turn]
+        ChessAI.last_search = None
+        start = time.perf_counter()
+        chosen = ENGINES[name](game_state, valid_moves, max_depth, time_limit)
+        seconds[name] += time.perf_counter() - start
+        if ChessAI.last_search is not None:  # only the searches count their nodes
+            nodes[name] += ChessAI.last_search.nodes + ChessAI.last_search.quiescence_nodes
+        moves.append(chosen.get_chess_notation())
+        game_state.make_move(chosen)
+        valid_moves = game_state.get_valid_moves()
+    if game_state.check_mate:
+        result, reason = ("0-1" if game_state.white_turn else "1-0"), "checkmate"
+    elif game_state.stale_mate:
+        result, reason = "1/2-1/2", "stalemate"
+    elif game_state.draw_reason() is not None:
+        result, reason = "1/2-1/2", game_state.draw_reason()
+    else:
+        result, reason = "1/2-1/2", "move limit"
+    return {"white": white, "black": black, "result": result, "reason": reason, "plies": len(moves), "moves": moves,
+            "seconds": seconds, "nodes": nodes,
+            "nodes_per_second": {name: nodes[name] / seconds[name] if seconds[name] > 0 else 0.0 for name in seconds}}
+
+
+"""
+Games for a round robin: games_per_pair between every two engines, the colours swapping each game
+"""
+
+
+def pairings(engine_names, games_per_pair, max_depth, time_limit, seed=0):
+    tasks = []
+    for first_index, first in enumerate(engine_names):
+        for second in engine_names[first_index + 1:]:
+            for game in range(games_per_pair):
+                white, black = (first, second) if game % 2 == 0 else (second, first)
+                tasks.append((white, black, max_depth, time_limit, seed + len(tasks)))
+    return tasks
+
+
+"""
+Wins, draws, losses and score for each engine, plus overall averages and throughput
+"""
+
+
+def summarise(games, wall_seconds):
+    engines = {}
+    for game in games:
+        for name, colour_score in ((game["white"], 1.0), (game["black"], 0.0)):
+            totals = engines.setdefault(name, {"games": 0, "wins": 0, "draws": 0, "losses": 0, "score": 0.0,
+                                               "seconds": 0.0, "nodes": 0})
+            totals["games"] += 1
+            if game["result"] == "1/2-1/2":
+                totals["draws"] += 1
+                totals["score"] += 0.5
+            elif (game["result"] == "1-0") == (colour_score == 1.0):
+                totals["wins"] += 1
+                totals["score"] += 1.0
+            else:
+                totals["losses"] += 1
+            totals["seconds"] += game["seconds"][name]
+            totals["nodes"] += game["nodes"][name]
+    for totals in engines.values():
+        totals["nodes_per_second"] = totals["nodes"] / totals["seconds"] if totals["seconds"] > 0 else 0.0
+    return {"games": len(games), "wall_seconds": wall_seconds,
+            "games_per_minute": len(games) * 60 / wall_seconds if wall_seconds > 0 else 0.0,
+            "average_plies": sum(game["plies"] for game in games) / len(games) if games else 0.0,
+            "engines": engines}
+
+
+"""
+Plays every game of the tournament over workers processes and returns (games, summary)
+"""
+
+
+def run_tournament(engine_names, games_per_pair, max_depth=ChessAI.MAX_DEPTH, time_limit=None, workers=None, seed=0):
+    tasks = pairings(engine_names, games_per_pair, max_depth, time_limit, seed)
+    workers = workers if workers is not None else os.cpu_count() or 1
+    start = time.perf_counter()
+    if workers == 1:
+        games = [play_game(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            games = list(pool.imap(play_game, tasks))
+    return games, summarise(games, time.perf_counter() - start)
+
+
+def print_summary(summary):
+    print("%d games in %.1fs, %.1f games/minute, %.1f plies on average" % (
+        summary["games"], summary["wall_seconds"], summary["games_per_minute"], summary["average_plies"]))
+    for name, totals in sorted(summary["engines"].items(), key=lambda item: -item[1]["score"]):
+        print("%-10s +%d =%d -%d  score %.1f/%d  %9.0f nodes/s" % (
+            name, totals["wins"], totals["draws"], totals["losses"], totals["score"], totals["games"],
+            totals["nodes_per_second"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the ChessAI engines against each other without a window")
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES), default=["greedy", "negamax"],
+                        help="engines to enter, every pair plays")
+    parser.add_argument("--games", type=int, default=2, help="games between each pair of engines")
+    parser.add_argument("--depth", type=int, default=ChessAI.MAX_DEPTH, help="search depth per move")
+    parser.add_argument("--time", type=float, default=None, help="seconds per move for the searching engines")
+    parser.add_argument("--workers", type=int, default=None, help="processes to play games on, default every core")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the first game, later games count up from it")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file to write the games and totals to")
+    args = parser.parse_args()
+    if len(args.engines) < 2:
+        parser.error("a tournament needs at least two engines")
+    games, summary = run_tournament(args.engines, args.games, args.depth, args.time, args.workers, args.seed)
+    with open(args.output, "w") as output:
+        json.dump({"settings": vars(args), "summary": summary, "games": games}, output, indent=1)
+    print_summary(summary)
+    print("games written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Fixed-size transposition table for the AI search. Positions are looked up by game_state.zobrist_key and each slot
+remembers how deep the position was searched, the score, whether that score is exact or only a bound, and the best move
+found, so the same position reached through a different move order doesn't have to be searched again.
+"""
+
+import sys
+
+# what the stored score means, the same way round as alpha-beta: a search that failed high only proves a lower bound
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class transposition_table():
+    def __init__(self, size_power=18):
+        # the number of slots is a power of 2 so a key's slot is just its lowest bits
+        self.size = 1 << size_power
+        self.index_mask = self.size - 1
+        self.entries = [None] * self.size  # each slot is None or a tuple (key, depth, flag, score, best_move, age)
+        self.age = 0  # bumped every new search so entries from old searches can be replaced even if they are deeper
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0  # stores that replaced a different position
+
+    """
+    Returns the entry for key as (depth, flag, score, best_move), or None if the position isn't in the table
+    """
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.index_mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        return None
+
+    """
+    Replace by depth: a slot is only overwritten by a search at least as deep, unless the old entry is from an earlier
+    search and so probably no longer useful
+    """
+
+    def store(self, key, depth, flag, score, best_move):
+        index = key & self.index_mask
+        entry = self.entries[index]
+        if entry is None or entry[5] != self.age or depth >= entry[1]:
+            if entry is not None and entry[0] != key:
+                self.overwrites += 1
+            self.entries[index] = (key, depth, flag, score, best_move, self.age)
+            self.stores += 1
+
+    def new_search(self):
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.age = 0
+        self.probes = self.hits = self.stores = self.overwrites = 0
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    """
+    Approximate bytes used by the table: the slot list plus every stored tuple and its numbers (moves are shared with
+    the move generator so they aren't counted)
+    """
+
+    def memory_use(self):
+        total = sys.getsizeof(self.entries)
+        for entry in self.entries:
+            if entry is not None:
+                total += sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[3])
+        return total
+
+    def get_stats(self):
+        used = self.size - self.entries.count(None)
+        return {"size": self.size, "used": used, "probes": self.probes, "hits": self.hits,
+                "hit_rate": self.hit_rate(), "stores": self.stores, "overwrites": self.overwrites,
+                "memory_bytes": self.memory_use()}
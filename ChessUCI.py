@@ -0,0 +1,186 @@
+"""
+UCI (Universal Chess Interface) front end, so the engine can be played from chess GUIs and match tools rather than only
+the pygame window. Point the GUI at "python ChessUCI.py".
+
+Commands are read from stdin on the main thread while a search runs in a background thread, so isready and stop are
+answered straight away during a search. Supported: uci, isready, ucinewgame, position startpos|fen ... [moves ...],
+go [depth n] [movetime ms] [wtime ms btime ms winc ms binc ms movestogo n] [infinite], stop, quit.
+"""
+
+import os
+import sys
+import threading
+
+import ChessAI
+import ChessBook
+import ChessEngine
+import ChessTablebase
+
+ENGINE_NAME = "ChessGameAI"
+ENGINE_AUTHOR = "ArmanK5"
+MAX_DEPTH = 64  # depth for go infinite and for time-limited searches, which stop on time long before this
+DEFAULT_MOVES_TO_GO = 30  # when the GUI doesn't say, plan as if this many moves are left to make in the time
+MOVE_OVERHEAD = 0.05  # seconds kept back each move for the GUI and pipes
+BOOK_PATH = "book.bin"  # opening book used when it exists
+TABLEBASE_DIRECTORY = "tablebases"  # endgame tables used when the folder exists
+
+
+"""
+Seconds to spend on a move out of the clock: an even share of the time left plus most of the increment, never more
+than half of what's left
+"""
+
+
+def time_for_move(time_left, increment=0.0, moves_to_go=None):
+    budget = time_left / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 0.75
+    return max(0.01, min(budget, time_left / 2) - MOVE_OVERHEAD)
+
+
+"""
+Score in UCI form: "cp <centipawns>", or "mate <moves>" (negative when the engine is being mated)
+"""
+
+
+def uci_score(score):
+    if score > ChessAI.MATE_BOUND:
+        return "mate %d" % ((ChessAI.CHECKMATE - score + 1) // 2)
+    if score < -ChessAI.MATE_BOUND:
+        return "mate %d" % -((ChessAI.CHECKMATE + score + 1) // 2)
+    return "cp %d" % score
+
+
+class uci_engine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()  # the search thread writes info and bestmove lines too
+        self.game_state = ChessEngine.game_state()
+        self.search = None
+        self.search_thread = None
+        self.stop_requested = threading.Event()  # go infinite holds its bestmove back until this is set
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    """
+    Handles one line from the GUI. Returns False once the engine should exit
+    """
+
+    def handle(self, line):
+        words = line.split()
+        if not words:
+            return True
+        command = words[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            ChessAI.transposition_table.clear()
+            self.game_state = ChessEngine.game_state()
+        elif command == "position":
+            self.stop_search()
+            self.set_position(words[1:])
+        elif command == "go":
+            self.stop_search()
+            self.go(words[1:])
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            self.stop_search()
+            return False
+        return True  # anything else is ignored, as the protocol asks
+
+    """
+    position startpos [moves e2e4 e7e5 ...] or position fen <six fields> [moves ...]
+    """
+
+    def set_position(self, words):
+        moves = words.index("moves") if "moves" in words else len(words)
+        if words and words[0] == "fen":
+            try:
+                self.game_state = ChessEngine.game_state(fen=" ".join(words[1:moves]))
+            except ValueError as error:  # keep the last position rather than exit, the GUI is told why
+                self.send("info string " + str(error))
+                return
+        else:
+            self.game_state = ChessEngine.game_state()
+        for notation in words[moves + 1:]:
+            for valid_move in self.game_state.get_valid_moves():
+                if valid_move.get_chess_notation() == notation:
+                    self.game_state.make_move(valid_move)
+                    break
+            else:
+                self.send("info string illegal move " + notation)
+                return
+
+    def go(self, words):
+        options = {}
+        for index, word in enumerate(words):
+            if word in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo") and index + 1 < len(words):
+                options[word] = int(words[index + 1])
+        max_depth = options.get("depth", MAX_DEPTH)
+        time_limit = None
+        if "movetime" in options:
+            time_limit = max(0.01, options["movetime"] / 1000 - MOVE_OVERHEAD)
+        elif "wtime" in options or "btime" in options:
+            colour = "w" if self.game_state.white_turn else "b"
+            if colour + "time" in options:
+                time_limit = time_for_move(options[colour + "time"] / 1000, options.get(colour + "inc", 0) / 1000,
+                                           options.get("movestogo"))
+        valid_moves = self.game_state.get_valid_moves()
+        known_move = ChessAI.known_move(self.game_state, valid_moves)
+        if known_move is not None and "infinite" not in words:
+            self.send("bestmove " + known_move.get_chess_notation())
+            return
+        self.search = ChessAI.negamax_search(max_depth, time_limit)
+        self.search.on_iteration = self.send_info
+        self.stop_requested.clear()
+        # the search makes and undoes moves on its own copy, the next position command replaces self.game_state
+        self.search_thread = threading.Thread(target=self.run_search, args=(self.search, self.game_state.clone(),
+                                                                            valid_moves, "infinite" in words), daemon=True)
+        self.search_thread.start()
+
+    def run_search(self, search, game_state, valid_moves, infinite):
+        best_move = search.search(game_state, valid_moves)
+        if infinite:  # the protocol says bestmove only comes after stop, even if the search ends by itself first
+            self.stop_requested.wait()
+        self.send("bestmove " + (best_move.get_chess_notation() if best_move is not None else "0000"))
+
+    def send_info(self, iteration):
+        seconds = iteration["seconds"]
+        nodes = self.search.nodes + self.search.quiescence_nodes
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" % (
+            iteration["depth"], uci_score(iteration["score"]), nodes, nodes / seconds if seconds > 0 else 0,
+            seconds * 1000, " ".join(iteration["pv"])))
+
+    """
+    Stops any running search and waits for its bestmove line, so replies always come in the order the GUI expects
+    """
+
+    def stop_search(self):
+        if self.search_thread is not None:
+            self.search.stop()
+            self.stop_requested.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    if os.path.exists(BOOK_PATH):
+        ChessAI.opening_book = ChessBook.opening_book(BOOK_PATH)
+    if os.path.isdir(TABLEBASE_DIRECTORY):
+        ChessAI.endgame_tables = ChessTablebase.tablebase(TABLEBASE_DIRECTORY)
+    engine = uci_engine()
+    for line in sys.stdin:  # blocks only this thread, the search carries on in its own
+        if not engine.handle(line):
+            break
+    engine.stop_search()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Zobrist hashing. Every (piece, square) pair, the side to move, each of the 16 castle rights combinations and each en
+passant file gets a random 64-bit number, and a position's key is all of its numbers xor'd together. game_state keeps
+its key up to date as pieces move so positions reached by different move orders get the same key.
+"""
+
+import random
+
+_random = random.Random(20210709)  # fixed seed so keys are the same every run (and in every worker process)
+
+PIECE_KEYS = {piece: [_random.getrandbits(64) for sq in range(64)]
+              for piece in ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")}
+WHITE_TO_MOVE_KEY = _random.getrandbits(64)
+CASTLE_KEYS = [_random.getrandbits(64) for mask in range(16)]  # indexed by castle_rights.get_mask()
+ENPASSANT_KEYS = [_random.getrandbits(64) for file in range(8)]
+
+
+"""
+Builds a key from scratch, used when a game_state is created and to check the incremental key
+"""
+
+
+def compute_key(gs):
+    key = 0
+    for row in range(8):
+        for file in range(8):
+            piece = gs.board[row][file]
+            if piece != "E":
+                key ^= PIECE_KEYS[piece][row * 8 + file]
+    if gs.white_turn:
+        key ^= WHITE_TO_MOVE_KEY
+    key ^= CASTLE_KEYS[gs.current_castle_rights.get_mask()]
+    if gs.enpassant_possible != ():
+        key ^= ENPASSANT_KEYS[gs.enpassant_possible[1]]
+    return key
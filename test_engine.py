@@ -0,0 +1,86 @@
+"""
+Tests for game_state beyond the move counts ChessPerft.py checks: reading FEN, attack queries, null moves and the move
+index the window uses
+"""
+
+import pytest
+
+import ChessEngine
+from ChessPerft import PERFT_POSITIONS, load_fen
+
+
+def test_null_move_restores_position():
+    for name, fen, expected in PERFT_POSITIONS + [("en passant", "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", [])]:
+        gs = load_fen(fen)
+        gs.make_null_move()
+        assert gs.zobrist_key == ChessEngine.ChessZobrist.compute_key(gs), name
+        assert gs.white_turn != (fen.split()[1] == "w") and gs.enpassant_possible == (), name
+        gs.undo_null_move()
+        assert gs.get_fen() == fen and gs.zobrist_key == ChessEngine.ChessZobrist.compute_key(gs), name
+
+
+def test_move_index():
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen)
+        index = gs.get_move_index()
+        assert sorted(move.move_ID for move in index.moves) == sorted(move.move_ID for move in gs.get_valid_moves()), name
+        for move in index.moves:
+            assert move in index.moves_from(move.initial_row, move.first_file), name
+            assert index.find(ChessEngine.move((move.initial_row, move.first_file), (move.last_row, move.last_file),
+                                               gs.board, promotion_piece=move.promotion_piece)) is move, name
+        assert gs.get_move_index() is index, name  # reused until a move is made
+        gs.make_move(index.moves[0])
+        assert gs.get_move_index() is not index, name
+        gs.undo_move()
+        assert sorted(move.move_ID for move in gs.get_move_index().moves) == sorted(move.move_ID for move in index.moves)
+
+
+def test_fen_castling_needs_king_and_rook():
+    # rights for a king or rook that has left its square are dropped, rather than castling from the wrong square
+    assert load_fen("4k3/8/8/8/8/8/8/4K3 w K - 0 1").get_fen() == "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
+    gs = load_fen("r3k2r/8/8/8/8/8/8/R4K1R w KQkq - 0 1")
+    assert gs.get_fen() == "r3k2r/8/8/8/8/8/8/R4K1R w kq - 0 1"
+    assert not any(move.is_castle_move for move in gs.get_valid_moves())
+    assert load_fen("4k3/8/8/8/8/8/8/6K1 w K - 0 1").get_valid_moves()
+    assert load_fen("4k3/8/8/4P3/8/8/8/4K3 w - d6 0 2").enpassant_possible == ()  # no pawn went past d6
+
+
+BAD_FENS = [
+    "",
+    "8/8/8/8 w - - 0 1",  # too few ranks
+    "4k3/8/8/8/8/8/8/4K4 w - - 0 1",  # a rank of 9 squares
+    "4k3/8/8/8/8/8/8/4KZ2 w - - 0 1",
+    "4k3/8/8/8/8/8/8/8 w - - 0 1",  # no white king
+    "4k2P/8/8/8/8/8/8/4K3 w - - 0 1",
+    "4k3/8/8/8/8/8/8/4K3 x - - 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w X - 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - e4 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - - a 1",
+    "4k3/8/8/8/8/8/8/4R1K1 w - - 0 1",  # black is in check with white to move
+]
+
+
+def test_bad_fen_raises():
+    for fen in BAD_FENS:
+        with pytest.raises(ValueError):
+            load_fen(fen)
+
+
+def test_get_attackers():
+    # the knight on d2 is pinned but still attacks, the rook behind it is only an x-ray
+    gs = load_fen("3r2k1/8/8/8/8/2b5/3N4/Q1RRK3 w - - 0 1")
+    assert gs.get_attackers(0, 3, 'w') == []  # d8, the d1 rook is blocked by the knight
+    assert gs.get_attackers(4, 4, 'w') == [(6, 3)]  # e4
+    assert sorted(gs.get_attackers(6, 3)) == [(0, 3), (5, 2)]  # d2, by black as white is to move
+    assert sorted(gs.get_attackers(7, 1, 'w')) == [(6, 3), (7, 0), (7, 2)]  # b1
+    # the bitboards and the board scan agree on every square for both colours
+    for name, fen, expected in PERFT_POSITIONS + [("pins", "3r2k1/8/8/8/8/2b5/3N4/Q1RRK3 w - - 0 1", [])]:
+        bitboard_state = load_fen(fen)
+        board_state = load_fen(fen, use_bitboards=False)
+        for row in range(8):
+            for file in range(8):
+                for colour in "wb":
+                    assert sorted(bitboard_state.get_attackers(row, file, colour)) == \
+                        sorted(board_state.get_attackers(row, file, colour)), (name, row, file, colour)
+                assert bitboard_state.square_under_attack(row, file) == \
+                    bool(board_state.get_attackers(row, file)), (name, row, file)
@@ -0,0 +1,118 @@
+"""
+Tests for reading PGN files and what is built on them: the analysis and the opening book
+"""
+
+import io
+
+import ChessAI
+import ChessAnalysis
+import ChessBook
+import ChessEngine
+import ChessPGN
+
+# a comment, a variation, a NAG, castling, a promotion, a queen named by its square when it didn't need to
+# be and a mate, then a second game
+GAMES = """[Event "Rook and pawn"]
+[FEN "k7/p1P5/8/8/8/8/8/R3K2R w KQ - 0 1"]
+
+1. O-O {castles} (1. O-O-O Kb7 2. c8=Q+) 1... Kb7 2. c8=Q+ $1 Kb6
+3. Qc8c7+ Kb5 4. Rfb1# 1-0
+
+[Event "Fool's mate"]
+
+1. f3 e5 2. g4?? Qh4# 0-1
+"""
+
+
+def test_read_and_replay_games():
+    games = list(ChessPGN.read_games(io.StringIO(GAMES)))
+    assert [(headers["Event"], sans, result) for headers, sans, result in games] == [
+        ("Rook and pawn", ["O-O", "Kb7", "c8=Q+", "Kb6", "Qc8c7+", "Kb5", "Rfb1#"], "1-0"),
+        ("Fool's mate", ["f3", "e5", "g4??", "Qh4#"], "0-1")]
+    headers, sans, result = games[0]
+    played = []
+    for game_state, move in ChessPGN.replay(headers, sans):
+        played.append(ChessPGN.move_to_san(game_state, move, game_state.get_valid_moves()))
+        last = game_state
+    assert played == ["O-O", "Kb7", "c8=Q+", "Kb6", "Qc7+", "Kb5", "Rfb1#"]  # written back as proper SAN
+    last.get_valid_moves()  # replay made the last move itself when the loop asked for the next
+    assert last.check_mate and last.get_fen() == "8/p1Q5/8/1k6/8/8/8/RR4K1 b - - 4 4"
+
+
+
+def test_byte_order_mark(tmp_path):
+    # the first game's tags have to be read as tags whether or not the file is opened as utf-8-sig
+    games = list(ChessPGN.read_games(io.StringIO("\ufeff" + GAMES)))
+    assert games[0][0] == {"Event": "Rook and pawn", "FEN": "k7/p1P5/8/8/8/8/8/R3K2R w KQ - 0 1"} and len(games) == 2
+    pgn_path = tmp_path / "bom.pgn"
+    pgn_path.write_bytes(b"\xef\xbb\xbf" + GAMES.split("[Event \"Fool")[0].encode())
+    output = io.StringIO()
+    assert ChessAnalysis.analyse_file(str(pgn_path), output, depth=1, workers=1) == (1, 7)
+    assert output.getvalue().startswith('{"headers": {"Event": "Rook and pawn"')
+
+def test_analysis_finds_the_blunder():
+    headers, sans, result = list(ChessPGN.read_games(io.StringIO(GAMES)))[1]
+    record = ChessAnalysis.analyse_game((headers, sans, result, 2))
+    assert record["complete"] and [played["san"] for played in record["moves"]] == ["f3", "e5", "g4", "Qh4#"]
+    assert [played["blunder"] for played in record["moves"]] == [False, False, True, False]
+    g4 = record["moves"][2]
+    # the scores are from each side's own point of view, g4 throws away a level position for being mated
+    assert g4["best_san"] is not None and g4["loss"] == ChessAnalysis.capped(g4["best_score"]) + ChessAnalysis.SCORE_CAP
+    assert g4["score"] == -(ChessAI.CHECKMATE - 1)  # from white's point of view, black mates next move
+    assert record["moves"][3]["loss"] == 0 and record["moves"][3]["score"] == -ChessAI.CHECKMATE
+    annotated = ChessAnalysis.annotate_pgn(record)
+    assert "2. g4?? {#-1, best " in annotated and "Qh4# {#} 0-1" in annotated
+
+
+
+def test_analysis_carries_on_past_a_bad_fen():
+    broken = '[Event "Broken"]\n[FEN "8/8/8/8 w - - 0 1"]\n\n1. Kd2 *\n\n'
+    games = ChessPGN.read_games(io.StringIO(GAMES.replace('[Event "Fool', broken + '[Event "Fool')))
+    records = list(ChessAnalysis.analyse_games(games, depth=1, workers=2))
+    assert [record["headers"]["Event"] for record in records] == ["Rook and pawn", "Broken", "Fool's mate"]
+    assert [record["complete"] for record in records] == [True, False, True]
+    assert records[0]["error"] is None and "8 ranks" in records[1]["error"] and records[1]["moves"] == []
+    assert ChessAnalysis.annotate_pgn(records[1]).endswith("{" + records[1]["error"] + "} *\n\n")
+
+def test_book_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(ChessBook, "MAX_WEIGHT", 4)  # small enough for a few games to go over it
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text("1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 *\n\n" * 6 + "1. d4 d5 *\n\n" * 2)
+    book_path = str(tmp_path / "book.bin")
+    assert ChessBook.build_book(str(pgn_path), book_path, max_depth=7) == 9  # seven plies of one game and d4 d5
+    book = ChessBook.opening_book(book_path)
+    game_state = ChessEngine.game_state()
+    # played 6 and 2 times, scaled together so the larger fits under MAX_WEIGHT
+    assert sorted((move.get_chess_notation(), weight) for move, weight in
+                  book.get_moves(game_state, game_state.get_valid_moves())) == [("d2d4", 1), ("e2e4", 4)]
+    for san in ["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5"]:
+        valid_moves = game_state.get_valid_moves()
+        game_state.make_move(ChessPGN.san_to_move(game_state, san, valid_moves))
+    # castling is stored as the king taking its own rook, e1 to h1, and comes back out as the engine's castle move
+    assert [ChessBook.encode_move(move) for move, weight in book.get_moves(game_state, game_state.get_valid_moves())] \
+        == [7 | 4 << 6]
+    assert [entry[0] for entry in book.get_entries(game_state.zobrist_key)] == [7 | 4 << 6]
+    castle = book.choose_move(game_state, game_state.get_valid_moves())
+    assert castle.is_castle_move and castle.get_chess_notation() == "e1g1"
+    book.close()
+    # a book followed for only six plies leaves this position, the seventh ply, to the search
+    book = ChessBook.opening_book(book_path, max_depth=6)
+    assert book.choose_move(game_state, game_state.get_valid_moves()) is None
+    game_state.make_move(castle)
+    assert book.get_moves(game_state, game_state.get_valid_moves()) == []  # Nf6 was the eighth ply, past what was built
+    book.close()
+
+
+
+def test_book_skips_games_it_cannot_read(tmp_path):
+    # Latin-1 names and a broken FEN tag cost only their own game, not the whole build
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_bytes('[White "Müller"]\n\n1. e4 e5 *\n\n[FEN "8/8/8/8 w - - 0 1"]\n\n1. Kd2 *\n\n'
+                         '1. d4 *\n'.encode("latin-1"))
+    book_path = str(tmp_path / "book.bin")
+    assert ChessBook.build_book(str(pgn_path), book_path) == 3
+    book = ChessBook.opening_book(book_path)
+    game_state = ChessEngine.game_state()
+    assert sorted(move.get_chess_notation() for move, weight in
+                  book.get_moves(game_state, game_state.get_valid_moves())) == ["d2d4", "e2e4"]
+    book.close()
@@ -0,0 +1,180 @@
+"""
+Tests for the AI search and what it is built from: search stats, leaf evaluation, the quiescence search and the
+endgame tables
+"""
+
+import json
+import random
+
+import pytest
+
+import ChessAI
+import ChessOrdering
+import ChessStats
+import ChessTablebase
+from ChessPerft import PERFT_POSITIONS, load_fen
+
+
+def test_search_stats():
+    gs = load_fen(PERFT_POSITIONS[1][1])
+    stats = ChessStats.search_stats()
+    search = ChessAI.negamax_search(2, stats=stats)
+    search.search(gs, gs.get_valid_moves())
+    summary = json.loads(stats.to_json())
+    assert summary["nodes"] == search.nodes and summary["quiescence_nodes"] == search.quiescence_nodes
+    assert summary["move_generations"] > 0 and summary["evaluations"] > 0 and summary["table_probes"] > 0
+    assert set(summary["phase_seconds"]) == {"move_generation", "depth 1", "depth 2"}
+    assert gs.stats is None  # detached again so later searches without stats don't count into it
+
+
+
+def test_search_stats_count_each_search():
+    # the search object's counters carry on from one search to the next, the stats are for one search only
+    gs = load_fen(PERFT_POSITIONS[1][1])
+    stats = ChessStats.search_stats()
+    search = ChessAI.negamax_search(3, stats=stats)
+    search.search(gs, gs.get_valid_moves())
+    first = {name: getattr(search, name) for name in ChessStats.PRUNING_COUNTERS}
+    assert stats.get_stats()["pruning"] == first
+    gs.make_move(gs.get_valid_moves()[0])
+    search.search(gs, gs.get_valid_moves())
+    assert stats.get_stats()["pruning"] == {name: getattr(search, name) - first[name]
+                                            for name in ChessStats.PRUNING_COUNTERS}
+    assert stats.get_stats()["nodes"] == search.nodes - search.nodes_before
+
+
+def test_batch_evaluation_matches():
+    pytest.importorskip("numpy")
+    import ChessEval
+    for name, fen, expected in PERFT_POSITIONS:
+        gs = load_fen(fen)
+        moves = gs.get_packed_moves()  # covers castling, en passant and promotions across the positions
+        scores = ChessEval.evaluate_batch(gs, moves)
+        for packed, score in zip(moves, scores):
+            gs.make_packed_move(packed)
+            assert score == gs.material_score + gs.position_score, (name, packed)
+            gs.undo_move()
+
+
+"""
+The packed move in gs with the given notation, like e1e5
+"""
+
+
+def find_move(gs, notation):
+    return next(move for move in gs.get_valid_moves() if move.get_chess_notation() == notation).packed
+
+
+def test_static_exchange():
+    # the two standard examples from the chessprogramming wiki: the pawn is free for the rook, the knight is lost
+    gs = load_fen("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1")
+    assert ChessOrdering.static_exchange(gs, find_move(gs, "e1e5")) == 100
+    gs = load_fen("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1")
+    assert ChessOrdering.static_exchange(gs, find_move(gs, "d3e5")) == 100 - 320
+
+
+def test_quiescence():
+    # the queen is hanging, so the position is worth what it is after exd5 rather than its static score
+    gs = load_fen("4k3/8/8/3q4/4P3/8/8/4K3 w - - 0 1")
+    gs.make_packed_move(find_move(gs, "e4d5"))
+    after_capture = -ChessAI.score_board(gs)
+    gs.undo_move()
+    search = ChessAI.negamax_search(1)
+    assert ChessAI.score_board(gs) < 0 < after_capture
+    assert search.quiescence(gs, -ChessAI.CHECKMATE, ChessAI.CHECKMATE, 0) == after_capture
+    # winning a pawn can't get the score up to alpha, so exd5 is skipped without being searched
+    gs = load_fen("4k3/8/8/3p4/4P3/8/8/4K3 w - - 0 1")
+    search = ChessAI.negamax_search(1)
+    assert search.quiescence(gs, 1000, 1001, 0) == ChessAI.score_board(gs)
+    assert search.delta_pruned == 1 and search.quiescence_nodes == 1
+
+
+"""
+FEN for two kings and a rook, with side to move
+"""
+
+
+def rook_ending_fen(white_king, black_king, rook, rook_colour, side):
+    board = [["1"] * 8 for row in range(8)]
+    board[white_king // 8][white_king % 8] = "K"
+    board[black_king // 8][black_king % 8] = "k"
+    board[rook // 8][rook % 8] = "R" if rook_colour == "w" else "r"
+    rows = ["".join(row) for row in board]
+    for length in range(8, 1, -1):
+        rows = [row.replace("1" * length, str(length)) for row in rows]
+    return "/".join(rows) + " %s - - 0 1" % side
+
+
+def test_tablebase_matches_move_generator(tmp_path):
+    # every probe has to agree with the best of the positions a move away, found with the move generator
+    ChessTablebase.write_table(ChessTablebase.generate('R'), 'R', str(tmp_path))
+    tables = ChessTablebase.tablebase(str(tmp_path))
+    rng = random.Random(16)
+    checked = 0
+    while checked < 200:
+        white_king, black_king, rook = rng.sample(range(64), 3)
+        if abs(white_king // 8 - black_king // 8) <= 1 and abs(white_king % 8 - black_king % 8) <= 1:
+            continue
+        try:
+            gs = load_fen(rook_ending_fen(white_king, black_king, rook, rng.choice("wb"), rng.choice("wb")))
+        except ValueError:
+            continue  # the side that just moved left in check
+        checked += 1
+        children = []
+        for move in gs.get_valid_moves():
+            gs.make_move(move)
+            children.append(tables.probe(gs))
+            gs.undo_move()
+        if not children:
+            expected = (ChessTablebase.LOSS, 0) if gs.in_check() else (ChessTablebase.DRAW, 0)
+        elif any(result == ChessTablebase.LOSS for result, plies in children):
+            expected = (ChessTablebase.WIN, 1 + min(plies for result, plies in children if result == ChessTablebase.LOSS))
+        elif any(result == ChessTablebase.DRAW for result, plies in children):
+            expected = (ChessTablebase.DRAW, 0)
+        else:
+            expected = (ChessTablebase.LOSS, 1 + max(plies for result, plies in children))
+        assert tables.probe(gs) == expected, gs.get_fen()
+    tables.close()
+
+
+"""
+negamax_search of the position with null-move pruning and late move reductions both on or both off, from empty tables
+so the two runs don't share work
+"""
+
+
+def pruned_search(fen, depth, pruning):
+    ChessAI.transposition_table.clear()
+    ChessAI.move_ordering.clear()
+    random.seed(0)
+    gs = load_fen(fen)
+    search = ChessAI.negamax_search(depth, null_move=pruning, late_move_reductions=pruning)
+    move = search.search(gs, gs.get_valid_moves())
+    return search, move.get_chess_notation()
+
+
+def test_pruning_keeps_tactics():
+    # mates in 3, found at depth 5 with the pruning taking part in the search
+    for fen, mate in [("8/1p1R4/3Q4/r7/6K1/8/5k2/8 w - - 0 1", "d6g3"), ("8/3k4/1K6/2R5/2Q2p2/8/7r/8 w - - 0 1", "c4f7"),
+                      ("8/2k5/8/3Q3R/8/3r4/2K4p/8 w - - 0 1", "h5h7")]:
+        full, full_move = pruned_search(fen, 5, False)
+        pruned, pruned_move = pruned_search(fen, 5, True)
+        assert full_move == pruned_move == mate and full.best_score == pruned.best_score == ChessAI.CHECKMATE - 5, fen
+        assert pruned.null_move_tries and pruned.reduced_moves, fen
+    # a free queen and a knight fork
+    for fen, capture in [("r1b2rk1/ppp2ppp/8/3q4/8/8/PPPQ1PPP/R3R1K1 w - - 0 1", "d2d5"),
+                         ("r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1", "b5c7")]:
+        assert pruned_search(fen, 5, False)[1] == pruned_search(fen, 5, True)[1] == capture, fen
+    # a reduced quiet move can hide a mate for a ply: this one is only seen a ply deeper with the reductions on
+    fen = "8/3K3Q/k2r4/4R3/6p1/8/8/8 w - - 0 1"
+    assert pruned_search(fen, 5, False)[0].best_score == pruned_search(fen, 6, True)[0].best_score == ChessAI.CHECKMATE - 5
+
+
+def test_no_null_move_with_only_pawns():
+    # black wins only because white, to move after Kf3, has to let the pawn through. With just kings and pawns the
+    # null move has to stay off, passing is the one thing white can't do
+    fen = "8/8/8/8/8/4k3/4p3/4K3 b - - 0 1"
+    full, full_move = pruned_search(fen, 6, False)
+    pruned, pruned_move = pruned_search(fen, 6, True)
+    assert pruned.null_move_tries == 0
+    assert full_move == pruned_move == "e3f3" and full.best_score == pruned.best_score > 800
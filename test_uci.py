@@ -0,0 +1,73 @@
+"""
+Tests for the UCI front end, driving uci_engine.handle with the GUI's lines and reading its replies
+"""
+
+import io
+
+import ChessEngine
+import ChessUCI
+
+KIWIPETE = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+
+def replies(output):
+    return output.getvalue().splitlines()
+
+
+def bestmove(output):
+    lines = [line for line in replies(output) if line.startswith("bestmove")]
+    assert len(lines) == 1, replies(output)
+    return lines[0].split()[1]
+
+
+def test_handshake():
+    output = io.StringIO()
+    engine = ChessUCI.uci_engine(output)
+    assert engine.handle("uci") and engine.handle("isready")
+    assert replies(output) == ["id name " + ChessUCI.ENGINE_NAME, "id author " + ChessUCI.ENGINE_AUTHOR, "uciok",
+                               "readyok"]
+    assert engine.handle("quit") is False
+
+
+def test_position_commands():
+    engine = ChessUCI.uci_engine(io.StringIO())
+    engine.handle("position startpos moves e2e4 e7e5")
+    assert engine.game_state.get_fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2"
+    engine.handle("position fen " + KIWIPETE + " moves e1g1 b4c3")
+    assert engine.game_state.get_fen() == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/4P3/2p2Q1p/PPPBBPPP/R4RK1 w kq - 0 2"
+    engine.handle("position fen " + KIWIPETE)
+    assert engine.game_state.get_fen() == KIWIPETE
+
+
+def test_bad_position_is_reported():
+    output = io.StringIO()
+    engine = ChessUCI.uci_engine(output)
+    engine.handle("position startpos moves e2e4")
+    engine.handle("position fen 8/8/8/8 w - - 0 1")
+    engine.handle("position startpos moves e2e5")
+    assert replies(output)[0].startswith("info string FEN board needs 8 ranks")
+    assert replies(output)[1] == "info string illegal move e2e5"
+
+
+def test_go_depth():
+    output = io.StringIO()
+    engine = ChessUCI.uci_engine(output)
+    engine.handle("position fen " + KIWIPETE)
+    engine.handle("go depth 2")
+    engine.search_thread.join()  # finishes by itself at depth 2, stop would cut it short
+    legal = [move.get_chess_notation() for move in ChessEngine.game_state(fen=KIWIPETE).get_valid_moves()]
+    assert bestmove(output) in legal
+    assert [line.split()[2] for line in replies(output) if line.startswith("info depth")] == ["1", "2"]
+
+
+def test_isready_and_stop_during_search():
+    output = io.StringIO()
+    engine = ChessUCI.uci_engine(output)
+    engine.handle("position startpos")
+    engine.handle("go infinite")
+    engine.handle("isready")  # answered straight away by this thread while the search carries on in its own
+    assert "readyok" in replies(output) and engine.search_thread.is_alive()
+    engine.handle("stop")
+    assert engine.search_thread is None
+    legal = [move.get_chess_notation() for move in ChessEngine.game_state().get_valid_moves()]
+    assert bestmove(output) in legal and replies(output)[-1].startswith("bestmove")